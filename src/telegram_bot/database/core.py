@@ -6,6 +6,7 @@ from dotenv import find_dotenv, load_dotenv
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import DDL, CreateColumn
 
 from ..auth.models import Base
 
@@ -64,6 +65,43 @@ def create_tables():
     logger.info("Tables created")
 
 
+def upgrade_tables():
+    """Create missing tables, columns and indexes declared on models but missing in the database.
+
+    ``create_all`` leaves existing tables untouched, so new nullable columns and indexes are added here.
+    Columns that existing rows cannot fill, NOT NULL without a server default, and indexes on them
+    are logged and skipped.
+    """
+    Base.metadata.create_all(engine)
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning(f"Not adding NOT NULL column {table.name}.{column.name} without a server default")
+                    continue
+                # Quoted column definition as CREATE TABLE would write it
+                definition = str(CreateColumn(column).compile(dialect=engine.dialect))
+                connection.execute(
+                    DDL("ALTER TABLE %(fullname)s ADD COLUMN %(definition)s", context={"definition": definition}).against(table)
+                )
+                logger.info(f"Added column {table.name}.{column.name}")
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if not {column.name for column in index.columns} <= existing_columns:
+                    logger.warning(f"Not creating index {index.name} on columns missing in {table.name}")
+                    continue
+                index.create(connection)
+                logger.info(f"Created index {index.name}")
+
+
 def drop_tables():
     """Drop tables in the database."""
     Base.metadata.drop_all(engine)
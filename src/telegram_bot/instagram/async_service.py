@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from .budget import BudgetExceededError
+from .cache import NO_REELS, NOT_FOUND, PRIVATE, CacheEntry, InstagramCache, MemoryCache
+from .concurrency import AsyncSingleFlight, background_priority, current_priority
+from .reels import Reel, normalize_media
+from .resilience import CircuitOpenError, UnexpectedAnswerError
+from .service import (
+    api_breaker,
+    api_budget,
+    api_limiter,
+    api_retry_policy,
+    config,
+    create_cache,
+    create_memory_cache,
+    is_user_not_found,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncInstagramWrapper:
+    """Asyncio counterpart of ``InstagramWrapper``
+
+    All requests go through one pooled ``httpx.AsyncClient`` with keep-alive, so
+    many lookups can be in flight from a single thread. The disk and memory
+    caches can be shared with a synchronous wrapper. Disk cache reads and writes
+    run in worker threads so they do not stall the event loop.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        cache: Optional[InstagramCache] = None,
+        memory: Optional[MemoryCache] = None,
+    ):
+        self.token = token
+        self.use_cache = True
+        self.http = httpx.AsyncClient(
+            base_url=config.http.base_url,
+            headers={"x-access-key": token, "accept": "application/json"},
+            timeout=config.http.timeout,
+            limits=httpx.Limits(
+                max_connections=config.http.max_connections,
+                max_keepalive_connections=config.http.max_keepalive_connections,
+                keepalive_expiry=config.http.keepalive_expiry,
+            ),
+        )
+        self.cache = cache or create_cache()
+        self.memory = memory or create_memory_cache()
+        self.single_flight = AsyncSingleFlight()
+        self.limiter = api_limiter
+        self.retry_policy = api_retry_policy
+        self.breaker = api_breaker
+        self.budget = api_budget
+        self.budget.attach(self.cache)
+        self._refresh_tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+    async def __aenter__(self) -> "AsyncInstagramWrapper":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        await self.http.aclose()
+
+    async def _get(self, path: str, **params) -> httpx.Response:
+        """Send a GET request once the shared rate limiter hands out a slot"""
+        await self.limiter.acquire_async(current_priority())
+        try:
+            return await self.http.get(path, params=params)
+        finally:
+            self.limiter.release()
+
+    async def _request(self, kind: str, path: str, missing_ok: bool = False, **params) -> Any:
+        """GET a HikerAPI endpoint through the circuit breaker, retrying transient failures
+
+        With ``missing_ok`` a 404 answer returns None instead of raising.
+        """
+        self.budget.check(kind, current_priority())
+
+        async def attempt():
+            self.breaker.before_call()
+            try:
+                response = await self._get(path, **params)
+                missing = missing_ok and response.status_code == 404
+                if not missing:
+                    response.raise_for_status()
+            except Exception as e:
+                self.breaker.record(e)
+                raise
+            self.breaker.record_success()
+            self.budget.charge(kind)
+            return None if missing else response.json()
+
+        return await self.retry_policy.acall(attempt)
+
+    async def _get_or_load(
+        self,
+        kind: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        stale_ok: bool,
+        amount: Optional[int] = None,
+    ) -> Optional[CacheEntry]:
+        """Async version of ``InstagramCache.get_or_load``, refreshing stale entries in a task"""
+        entry = await asyncio.to_thread(self.cache.get, kind, key)
+        if entry is not None and entry.covers(amount):
+            if self.cache.is_fresh(kind, entry):
+                return entry
+            if stale_ok and self.cache.is_servable(kind, entry):
+                if self.cache.background_refresh and (kind, key) not in self._refresh_tasks:
+                    task = asyncio.create_task(self._refresh(kind, key, loader, amount))
+                    self._refresh_tasks[(kind, key)] = task
+                return entry
+
+        try:
+            value = await loader()
+        except (CircuitOpenError, BudgetExceededError):
+            if entry is None:
+                raise
+            logger.warning(f"API unavailable, serving expired {kind} {key} ({int(entry.age())}s old)")
+            return entry
+        if not value:
+            return None
+        return await asyncio.to_thread(self.cache.set, kind, key, value, amount)
+
+    async def _refresh(
+        self, kind: str, key: str, loader: Callable[[], Awaitable[Any]], amount: Optional[int] = None
+    ) -> None:
+        try:
+            with background_priority():
+                value = await loader()
+            if value:
+                await asyncio.to_thread(self.cache.set, kind, key, value, amount)
+        except Exception as e:
+            logger.error(f"Background refresh of {kind} {key} failed: {e}")
+        finally:
+            self._refresh_tasks.pop((kind, key), None)
+
+    async def _get_reels(
+        self,
+        kind: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        normalize: Callable[..., list[Reel]],
+        stale_ok: bool,
+        amount: Optional[int] = None,
+    ) -> Optional[list[Reel]]:
+        if not self.use_cache:
+            media_list = await loader()
+            return normalize(media_list, fetched_at=time.time()) if media_list else None
+
+        entry = self.memory.get(kind, key)
+        if entry is None or not entry.covers(amount) or not self.cache.is_fresh(kind, entry):
+            raw_entry = await self._get_or_load(kind, key, loader, stale_ok, amount)
+            if raw_entry is None:
+                return None
+            reels = normalize(raw_entry.value, fetched_at=raw_entry.fetched_at)
+            entry = CacheEntry(reels, raw_entry.fetched_at, amount=raw_entry.amount)
+            self.memory.set(kind, key, entry)
+        return list(entry.value[:amount])
+
+    async def _fetch_amount(self, kind: str, key: str, n_media_items: int) -> int:
+        """Medias to request: never fewer than the cached entry holds, so refreshes do not shrink it"""
+        cached = await asyncio.to_thread(self.cache.get, kind, key) if self.use_cache else None
+        return max(n_media_items, cached.size()) if cached else n_media_items
+
+    async def get_negative_reason(self, username: str) -> Optional[str]:
+        """Reason code if the account recently turned out missing, private or without reels"""
+        if not self.use_cache:
+            return None
+        return await asyncio.to_thread(self.cache.get_negative, "user_negative", username)
+
+    async def _remember_negative(self, kind: str, key: str, reason: str) -> None:
+        if self.use_cache:
+            await asyncio.to_thread(self.cache.set_negative, kind, key, reason)
+
+    async def get_balance(self):
+        try:
+            balance = await self._request("balance", "/sys/balance")
+        except httpx.HTTPStatusError as e:
+            return {"status": e.response.status_code, "message": e.response.text}
+        return {"status": 200, "data": balance}
+
+    async def get_user_info(self, username: str, stale_ok: bool = True):
+        if await self.get_negative_reason(username) == NOT_FOUND:
+            return {"status": 404, "message": "User not found"}
+
+        async def fetch():
+            user = await self._request("user_info", "/v1/user/by/username", missing_ok=True, username=username)
+            if isinstance(user, dict) and "pk" in user:
+                return user
+            # Only a not-found answer is remembered, other error bodies are failures
+            if user is None or is_user_not_found(user):
+                return None
+            raise UnexpectedAnswerError(f"Unexpected user info answer for {username}: {str(user)[:200]}")
+
+        async def load():
+            return await self.single_flight.do(("user_info", username), fetch)
+
+        try:
+            if self.use_cache:
+                entry = await self._get_or_load("user_info", username, load, stale_ok)
+                user = entry.value if entry else None
+            else:
+                user = await load()
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching user info for {username}: {e}")
+            return {"status": 500, "message": "Internal server error"}
+        if not user:
+            await self._remember_negative("user_negative", username, NOT_FOUND)
+            return {"status": 404, "message": "User not found"}
+        return {"status": 200, "data": user}
+
+    async def fetch_user_reels(self, user, n_media_items: int = 25, stale_ok: bool = True):
+        username = user["username"]
+        user_id = user["pk"]
+
+        logger.info(f"Fetching reels for user {username} (ID: {user_id})")
+
+        if user["is_private"]:
+            await self._remember_negative("user_negative", username, PRIVATE)
+            return {"status": 403, "message": "Account is private"}
+        if await self.get_negative_reason(username) == NO_REELS:
+            return {"status": 402, "message": "No reels found"}
+
+        async def fetch():
+            amount = await self._fetch_amount("user_clips", username, n_media_items)
+            return await self._request("user_clips", "/v1/user/clips", user_id=user_id, amount=amount)
+
+        async def load():
+            return await self.single_flight.do(("user_clips", username, user_id, n_media_items), fetch)
+
+        try:
+            reels = await self._get_reels(
+                "user_clips",
+                username,
+                load,
+                lambda media_list, fetched_at: normalize_media(media_list, owner=username, fetched_at=fetched_at),
+                stale_ok,
+                n_media_items,
+            )
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching reels for user {username}: {e}")
+            return {"status": 500, "message": "Internal server error"}
+
+        if not reels:
+            await self._remember_negative("user_negative", username, NO_REELS)
+            return {"status": 402, "message": "No reels found"}
+        return {"status": 200, "data": reels}
+
+    async def fetch_hashtag_reels(self, hashtag: str, n_media_items: int = 50, stale_ok: bool = True):
+        if self.use_cache:
+            negative_reason = await asyncio.to_thread(self.cache.get_negative, "hashtag_negative", hashtag)
+            if negative_reason == NOT_FOUND:
+                return {"status": 404, "message": "Hashtag not found"}
+
+        async def fetch():
+            amount = await self._fetch_amount("hashtag_top", hashtag, n_media_items)
+            return await self._request("hashtag_top", "/v1/hashtag/medias/top", name=hashtag, amount=amount)
+
+        async def load():
+            return await self.single_flight.do(("hashtag_top", hashtag, n_media_items), fetch)
+
+        try:
+            reels = await self._get_reels("hashtag_top", hashtag, load, normalize_media, stale_ok, n_media_items)
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching reels for hashtag {hashtag}: {e}")
+            return {"status": 500, "message": "Internal server error"}
+
+        if reels is None:
+            await self._remember_negative("hashtag_negative", hashtag, NOT_FOUND)
+            return {"status": 404, "message": "Hashtag not found"}
+        logger.info(f"Found {len(reels)} reels for hashtag {hashtag}")
+        return {"status": 200, "data": reels}
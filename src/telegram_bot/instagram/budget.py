@@ -0,0 +1,127 @@
+import logging
+import threading
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from .concurrency import INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Degradation levels, each one keeps the restrictions of the previous ones
+NORMAL = 0
+LOW = 1  # cache TTLs are stretched
+SAVING = 2  # trend runs skip low-priority accounts
+CRITICAL = 3  # interactive requests that miss the cache are refused, stale entries are not refreshed
+LEVEL_NAMES = {NORMAL: "normal", LOW: "low", SAVING: "saving", CRITICAL: "critical"}
+
+_spender: ContextVar[Optional[int]] = ContextVar("api_spender", default=None)
+
+
+@contextmanager
+def spending_user(user_id: int) -> Iterator[None]:
+    """Charge API requests made in the block to a bot user"""
+    token = _spender.set(user_id)
+    try:
+        yield
+    finally:
+        _spender.reset(token)
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of calling the API when the budget does not allow it"""
+
+
+class BudgetManager:
+    """Track HikerAPI spending and degrade gracefully as the balance runs low
+
+    Spending is estimated from a per call type cost table and periodically
+    reconciled against the real balance reported by the API.
+    """
+
+    def __init__(
+        self,
+        costs: dict[str, float],
+        low_balance: float,
+        saving_balance: float,
+        critical_balance: float,
+        ttl_multiplier: float = 1.0,
+        trend_account_limit: int = 50,
+    ):
+        self.costs = dict(costs)
+        self.thresholds = {LOW: low_balance, SAVING: saving_balance, CRITICAL: critical_balance}
+        self.ttl_multiplier = ttl_multiplier
+        self.trend_account_limit = trend_account_limit
+        self.balance: Optional[float] = None
+        self.spent_since_reconcile = 0.0
+        self.total_spent = 0.0
+        self.spent_by_kind: Counter[str] = Counter()
+        self.spent_by_user: Counter[Optional[int]] = Counter()
+        self.level = NORMAL
+        # Caches die with their wrappers, attaching one twice keeps a single reference
+        self._caches = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @property
+    def estimated_balance(self) -> Optional[float]:
+        """Last known balance minus what was spent since, None before the first reconcile"""
+        if self.balance is None:
+            return None
+        return self.balance - self.spent_since_reconcile
+
+    def attach(self, cache) -> None:
+        """Keep the TTL scale and background refreshes of an ``InstagramCache`` in line with the budget level"""
+        with self._lock:
+            self._caches.add(cache)
+            self._apply(cache)
+
+    def _apply(self, cache) -> None:
+        cache.ttl_scale = self.ttl_multiplier if self.level >= LOW else 1.0
+        # Stale-while-revalidate refreshes run in the background lane, which check() never refuses
+        cache.background_refresh = self.level < CRITICAL
+
+    def _update_level(self) -> None:
+        balance = self.estimated_balance
+        level = NORMAL
+        if balance is not None:
+            for candidate, threshold in self.thresholds.items():
+                if balance < threshold:
+                    level = candidate
+        if level != self.level:
+            logger.warning(f"HikerAPI budget level changed to {LEVEL_NAMES[level]} (estimated balance {balance:.2f})")
+            self.level = level
+            for cache in self._caches:
+                self._apply(cache)
+
+    def charge(self, kind: str) -> None:
+        """Record one successful request of the given call type"""
+        cost = self.costs.get(kind, 0.0)
+        if not cost:
+            return
+        with self._lock:
+            self.total_spent += cost
+            self.spent_since_reconcile += cost
+            self.spent_by_kind[kind] += cost
+            self.spent_by_user[_spender.get()] += cost
+            self._update_level()
+
+    def reconcile(self, balance: float) -> None:
+        """Replace the running estimate with the balance reported by the API"""
+        with self._lock:
+            estimate = self.estimated_balance
+            if estimate is not None:
+                logger.info(f"HikerAPI balance {balance:.2f}, estimated {estimate:.2f}")
+            self.balance = balance
+            self.spent_since_reconcile = 0.0
+            self._update_level()
+
+    def check(self, kind: str, priority: int) -> None:
+        """Raise ``BudgetExceededError`` if a paid request with this priority may not be sent"""
+        if self.level >= CRITICAL and priority == INTERACTIVE and self.costs.get(kind, 0.0):
+            raise BudgetExceededError("HikerAPI budget is exhausted")
+
+    def skips_low_priority(self) -> bool:
+        """Whether trend runs should only process their highest-priority accounts"""
+        return self.level >= SAVING
@@ -0,0 +1,590 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+from urllib.parse import quote, unquote
+
+from . import codec
+from .budget import BudgetExceededError
+from .concurrency import background_priority
+from .resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Location of every cache kind under the cache directory: (folder, filename)
+CACHE_FILES = {
+    "user_info": ("user", "info.json"),
+    "user_clips": ("user", "reels.json"),
+    "hashtag_top": ("hashtag", "reels.json"),
+    "user_negative": ("user", "negative.json"),
+    "hashtag_negative": ("hashtag", "negative.json"),
+}
+
+# Fields of a cache file, files holding anything else are bare legacy payloads
+ENTRY_FIELDS = {"fetched_at", "value", "schema", "amount"}
+
+# Eviction policies of the disk tier: least recently or least frequently used first
+EVICTION_POLICIES = ("lru", "lfu")
+
+# Reason codes of negative cache entries
+NOT_FOUND = "not_found"
+PRIVATE = "private"
+NO_REELS = "no_reels"
+
+
+@dataclass
+class CacheEntry:
+    """Cached API payload together with the time it was fetched"""
+
+    value: Any
+    fetched_at: float
+    # Layout version of the value, 0 for raw API payloads
+    schema: int = 0
+    # Number of items requested when the value was fetched, None when unknown
+    amount: Optional[int] = None
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds elapsed since the payload was fetched"""
+        return (now if now is not None else time.time()) - self.fetched_at
+
+    def size(self) -> int:
+        """Number of items the entry answers for, the stored amount or the value's length"""
+        return self.amount if self.amount is not None else len(self.value)
+
+    def covers(self, amount: Optional[int]) -> bool:
+        """Whether a request for ``amount`` items can be served from this entry"""
+        return amount is None or self.size() >= amount
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a JSON-like value or slotted record in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(estimate_size(getattr(value, slot)) for slot in value.__slots__)
+    return size
+
+
+class MemoryCache:
+    """Process-local LRU cache bounded by entry count and total size"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[CacheEntry, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, kind: str, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            item = self._entries.get((kind, key))
+            if item is None:
+                return None
+            self._entries.move_to_end((kind, key))
+            return item[0]
+
+    def set(self, kind: str, key: str, entry: CacheEntry) -> None:
+        size = estimate_size(entry.value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((kind, key), None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[(kind, key)] = (entry, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def delete(self, kind: str, key: str) -> None:
+        with self._lock:
+            old = self._entries.pop((kind, key), None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+
+class FileCache:
+    """On-disk JSON cache with one file per (kind, key)
+
+    Files are compressed with ``compression`` but keep their names, plain JSON
+    files written before compression are read as they are. Reads set the file's
+    access time for LRU eviction, hit counts for LFU are kept in memory only.
+    """
+
+    def __init__(self, cache_dir: str = "cache", compression: str = "zlib"):
+        self.cache_dir = cache_dir
+        self.compression = codec.resolve_compression(compression)
+        self._hits = Counter()
+
+    def _path(self, kind: str, key: str) -> str:
+        folder, filename = CACHE_FILES[kind]
+        # Keys are user input, keep them a single harmless path component
+        component = quote(key, safe="")
+        if component in {"", ".", ".."}:
+            component = component.replace(".", "%2E") or "%00"
+        return os.path.join(self.cache_dir, folder, component, filename)
+
+    def get(self, kind: str, key: str) -> Optional[CacheEntry]:
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as f:
+                payload = codec.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read cache file {path}: {e}")
+            return None
+        self._touch(path)
+
+        if isinstance(payload, dict) and {"fetched_at", "value"} <= payload.keys() <= ENTRY_FIELDS:
+            return CacheEntry(payload["value"], payload["fetched_at"], payload.get("schema", 0), payload.get("amount"))
+        # Files written before entries were timestamped hold the bare payload
+        return CacheEntry(payload, os.path.getmtime(path))
+
+    def _touch(self, path: str) -> None:
+        self._hits[path] += 1
+        try:
+            # Keep the mtime, legacy entries use it as their fetch time
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> dict[str, CacheEntry]:
+        entries = {}
+        for key in keys:
+            entry = self.get(kind, key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def set(self, kind: str, key: str, entry: CacheEntry, expires_at: Optional[float] = None) -> None:
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        payload = {"schema": entry.schema, "fetched_at": entry.fetched_at, "value": entry.value}
+        if entry.amount is not None:
+            payload["amount"] = entry.amount
+        with open(tmp_path, "wb") as f:
+            f.write(codec.encode(payload, self.compression))
+        os.replace(tmp_path, path)
+
+    def entries(self) -> Iterator[tuple[str, str, CacheEntry]]:
+        """Yield (kind, key, entry) for every readable file in the cache directory"""
+        for kind, (folder, filename) in CACHE_FILES.items():
+            folder_path = os.path.join(self.cache_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for component in os.listdir(folder_path):
+                if not os.path.exists(os.path.join(folder_path, component, filename)):
+                    continue
+                key = unquote(component)
+                entry = self.get(kind, key)
+                if entry is not None:
+                    yield kind, key, entry
+
+    def evict(self, max_bytes: int, max_entries: int, policy: str = "lru") -> int:
+        """Delete the least used files until the cache fits the budget, return how many were deleted"""
+        files = []
+        for folder in {folder for folder, _ in CACHE_FILES.values()}:
+            folder_path = os.path.join(self.cache_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for entry_dir in os.scandir(folder_path):
+                if not entry_dir.is_dir():
+                    continue
+                for file in os.scandir(entry_dir.path):
+                    if file.name.endswith(".tmp"):
+                        continue
+                    stat = file.stat()
+                    files.append((file.path, stat.st_size, stat.st_atime))
+
+        total_bytes = sum(size for _, size, _ in files)
+        if total_bytes <= max_bytes and len(files) <= max_entries:
+            return 0
+        if policy == "lfu":
+            files.sort(key=lambda file: (self._hits[file[0]], file[2]))
+        else:
+            files.sort(key=lambda file: file[2])
+
+        evicted = 0
+        remaining = len(files)
+        for path, size, _ in files:
+            if total_bytes <= max_bytes and remaining <= max_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._hits.pop(path, None)
+            total_bytes -= size
+            remaining -= 1
+            evicted += 1
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                # Other kinds of the same key still live there
+                pass
+        return evicted
+
+
+class SQLiteCache:
+    """Single-file cache backend with compressed values keyed by (kind, key)"""
+
+    def __init__(self, path: str = "cache/instagram-cache.sqlite3", compression: str = "zlib"):
+        self.path = path
+        self.compression = codec.resolve_compression(compression)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    schema INTEGER NOT NULL DEFAULT 0,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+                """
+            )
+            # Access metadata for eviction, added to databases created before it existed
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(cache_entries)")}
+            if "accessed_at" not in columns:
+                self._connection.execute("ALTER TABLE cache_entries ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            if "hits" not in columns:
+                self._connection.execute("ALTER TABLE cache_entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+            if "amount" not in columns:
+                self._connection.execute("ALTER TABLE cache_entries ADD COLUMN amount INTEGER")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_fetched_at ON cache_entries (fetched_at)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)"
+            )
+
+    @staticmethod
+    def _decode(row: tuple) -> CacheEntry:
+        schema, fetched_at, amount, value = row
+        return CacheEntry(codec.decode(value), fetched_at, schema, amount)
+
+    def get(self, kind: str, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT schema, fetched_at, amount, value FROM cache_entries WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row:
+                self._connection.execute(
+                    "UPDATE cache_entries SET accessed_at = ?, hits = hits + 1 WHERE kind = ? AND key = ?",
+                    (time.time(), kind, key),
+                )
+        return self._decode(row) if row else None
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> dict[str, CacheEntry]:
+        """Read the entries of many keys of one kind in a single query"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            # json_each avoids the bound parameter limit for large key lists
+            rows = self._connection.execute(
+                "SELECT key, schema, fetched_at, amount, value FROM cache_entries "
+                "WHERE kind = ? AND key IN (SELECT value FROM json_each(?))",
+                (kind, json.dumps(keys)),
+            ).fetchall()
+            self._connection.execute(
+                "UPDATE cache_entries SET accessed_at = ?, hits = hits + 1 "
+                "WHERE kind = ? AND key IN (SELECT value FROM json_each(?))",
+                (time.time(), kind, json.dumps([row[0] for row in rows])),
+            )
+        return {row[0]: self._decode(row[1:]) for row in rows}
+
+    def set(self, kind: str, key: str, entry: CacheEntry, expires_at: Optional[float] = None) -> None:
+        value = codec.encode(entry.value, self.compression)
+        with self._lock:
+            # Upsert rather than replace to keep the hit count of refreshed entries
+            self._connection.execute(
+                "INSERT INTO cache_entries (kind, key, schema, fetched_at, amount, expires_at, value, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET schema = excluded.schema, fetched_at = excluded.fetched_at, "
+                "amount = excluded.amount, expires_at = excluded.expires_at, value = excluded.value, "
+                "accessed_at = excluded.accessed_at",
+                (kind, key, entry.schema, entry.fetched_at, entry.amount, expires_at, value, time.time()),
+            )
+
+    def entries(self) -> Iterator[tuple[str, str, CacheEntry]]:
+        """Yield (kind, key, entry) for every stored entry"""
+        with self._lock:
+            keys = self._connection.execute("SELECT kind, key FROM cache_entries").fetchall()
+        for kind, key in keys:
+            entry = self.get(kind, key)
+            if entry is not None:
+                yield kind, key, entry
+
+    def delete_expired(self, now: Optional[float] = None) -> int:
+        """Delete entries past their expiry time, return how many were deleted"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM cache_entries WHERE expires_at < ?", (now if now is not None else time.time(),)
+            )
+        return cursor.rowcount
+
+    def evict(self, max_bytes: int, max_entries: int, policy: str = "lru") -> int:
+        """Delete the least used entries until the cache fits the budget, return how many were deleted
+
+        Freed pages are reused by later writes, the database file itself does not shrink.
+        """
+        order = "hits, accessed_at" if policy == "lfu" else "accessed_at"
+        with self._lock:
+            count, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length(value)), 0) FROM cache_entries"
+            ).fetchone()
+            if total_bytes <= max_bytes and count <= max_entries:
+                return 0
+            evicted = []
+            for kind, key, size in self._connection.execute(
+                f"SELECT kind, key, length(value) FROM cache_entries ORDER BY {order}"  # noqa: S608
+            ):
+                if total_bytes <= max_bytes and count <= max_entries:
+                    break
+                evicted.append((kind, key))
+                total_bytes -= size
+                count -= 1
+            self._connection.executemany("DELETE FROM cache_entries WHERE kind = ? AND key = ?", evicted)
+        return len(evicted)
+
+
+class RawArchive:
+    """Cold archive of raw API payloads, one gzipped JSON lines file per kind and day"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+
+    def append(self, kind: str, key: str, value: Any, fetched_at: float) -> None:
+        day = time.strftime("%Y-%m-%d", time.gmtime(fetched_at))
+        path = os.path.join(self.archive_dir, kind, f"{day}.jsonl.gz")
+        line = json.dumps({"key": key, "fetched_at": fetched_at, "value": value}, ensure_ascii=False)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class InstagramCache:
+    """TTL cache with stale-while-revalidate semantics
+
+    An entry younger than ``ttl[kind]`` is fresh and served as is. A stale entry
+    younger than ``ttl[kind] + stale_ttl[kind]`` is served immediately while a
+    background worker refreshes it. Anything older is reloaded synchronously,
+    unless the circuit breaker is open or the budget refuses the request, in
+    which case it is served as a fallback. ``ttl_scale`` stretches both windows,
+    ``background_refresh`` off serves stale entries without refreshing them.
+
+    Kinds listed in ``projections`` are stored projected: ``projections[kind]``
+    is a (schema, function) pair applied to values on write, and on read to
+    entries written with another schema. Raw values can be kept in an archive.
+    """
+
+    def __init__(
+        self,
+        backend: "FileCache | SQLiteCache",
+        ttl: dict[str, float],
+        stale_ttl: dict[str, float],
+        negative_ttl: Optional[dict[str, float]] = None,
+        refresh_workers: int = 2,
+        projections: Optional[dict[str, tuple[int, Callable[[Any], Any]]]] = None,
+        archive: Optional[RawArchive] = None,
+    ):
+        self.backend = backend
+        self.ttl = dict(ttl)
+        self.stale_ttl = dict(stale_ttl)
+        self.negative_ttl = dict(negative_ttl or {})
+        self.projections = dict(projections or {})
+        self.archive = archive
+        self.ttl_scale = 1.0
+        self.background_refresh = True
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self._refreshing: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _upgrade(self, kind: str, entry: CacheEntry) -> CacheEntry:
+        if kind in self.projections:
+            schema, project = self.projections[kind]
+            if entry.schema != schema:
+                return CacheEntry(project(entry.value), entry.fetched_at, schema, entry.amount)
+        return entry
+
+    def get(self, kind: str, key: str) -> Optional[CacheEntry]:
+        entry = self.backend.get(kind, key)
+        return self._upgrade(kind, entry) if entry is not None else None
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> dict[str, CacheEntry]:
+        """Read the entries of many keys of one kind, in one query when the backend allows it"""
+        return {key: self._upgrade(kind, entry) for key, entry in self.backend.get_many(kind, keys).items()}
+
+    def _expires_at(self, kind: str, value: Any, fetched_at: float) -> Optional[float]:
+        if kind in self.ttl:
+            return fetched_at + (self.ttl[kind] + self.stale_ttl.get(kind, 0)) * self.ttl_scale
+        if isinstance(value, dict) and value.get("reason") in self.negative_ttl:
+            return fetched_at + self.negative_ttl[value["reason"]] * self.ttl_scale
+        return None
+
+    def enforce_disk_budget(self, max_bytes: int, max_entries: int, policy: str = "lru") -> int:
+        """Drop expired entries where the backend tracks expiry, then evict down to the budget"""
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        removed = 0
+        if hasattr(self.backend, "delete_expired"):
+            removed += self.backend.delete_expired()
+        removed += self.backend.evict(max_bytes, max_entries, policy)
+        return removed
+
+    def migrate_from(self, source: "FileCache | SQLiteCache") -> int:
+        """Rewrite every entry of ``source`` into this cache's backend and compression
+
+        ``source`` may be this cache's own backend to recompress it in place.
+        Entries of projected kinds are projected as on write.
+        Returns the number of rewritten entries.
+        """
+        migrated = 0
+        for kind, key, stored in source.entries():
+            entry = self._upgrade(kind, stored)
+            self.backend.set(kind, key, entry, expires_at=self._expires_at(kind, entry.value, entry.fetched_at))
+            migrated += 1
+        return migrated
+
+    def set(
+        self, kind: str, key: str, value: Any, amount: Optional[int] = None, fetched_at: Optional[float] = None
+    ) -> CacheEntry:
+        """Store a freshly fetched value
+
+        Args:
+            amount: Number of items requested from the API. Recorded so that a
+                later request for at most as many items is served from this entry
+            fetched_at: Fetch time to record instead of now, for values only
+                partly refreshed
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        schema = 0
+        if amount is not None:
+            # Values merged with earlier pages can hold more than was requested
+            amount = max(amount, len(value))
+        if kind in self.projections:
+            if self.archive is not None:
+                self.archive.append(kind, key, value, fetched_at)
+            schema, project = self.projections[kind]
+            value = project(value)
+        entry = CacheEntry(value, fetched_at, schema, amount)
+        self.backend.set(kind, key, entry, expires_at=self._expires_at(kind, value, fetched_at))
+        return entry
+
+    def is_fresh(self, kind: str, entry: CacheEntry) -> bool:
+        return entry.age() < self.ttl[kind] * self.ttl_scale
+
+    def is_servable(self, kind: str, entry: CacheEntry) -> bool:
+        return entry.age() < (self.ttl[kind] + self.stale_ttl[kind]) * self.ttl_scale
+
+    def get_negative(self, kind: str, key: str) -> Optional[str]:
+        """Return the reason code of a remembered negative result, None if there is none"""
+        entry = self.get(kind, key)
+        if entry is None:
+            return None
+        reason = entry.value["reason"]
+        if entry.age() >= self.negative_ttl.get(reason, 0) * self.ttl_scale:
+            return None
+        return reason
+
+    def set_negative(self, kind: str, key: str, reason: str) -> None:
+        """Remember that (kind, key) yields no data, for the TTL of the reason"""
+        self.set(kind, key, {"reason": reason})
+
+    def get_or_load(
+        self,
+        kind: str,
+        key: str,
+        loader: Callable[[], Any],
+        stale_ok: bool = True,
+        amount: Optional[int] = None,
+    ) -> Optional[CacheEntry]:
+        """Return the cache entry for (kind, key), loading it when needed
+
+        Args:
+            kind: Cache kind, one of ``CACHE_FILES``
+            key: Username, hashtag or other identifier of the entry
+            loader: Callable fetching the value from the API. Empty results are not cached
+            stale_ok: Serve a stale entry and refresh it in background instead of
+                waiting for the loader
+            amount: Number of items the caller needs. Entries fetched for fewer
+                items are reloaded, larger ones are served as they are
+
+        Returns:
+            The cached or freshly loaded entry, None if the loader returned nothing
+        """
+        entry = self.get(kind, key)
+        if entry is not None and entry.covers(amount):
+            if self.is_fresh(kind, entry):
+                logger.info(f"Cache hit for {kind} {key}")
+                return entry
+            if stale_ok and self.is_servable(kind, entry):
+                logger.info(f"Serving stale {kind} {key} ({int(entry.age())}s old), refreshing in background")
+                self.refresh_in_background(kind, key, loader, amount)
+                return entry
+
+        try:
+            value = loader()
+        except (CircuitOpenError, BudgetExceededError):
+            if entry is None:
+                raise
+            logger.warning(f"API unavailable, serving expired {kind} {key} ({int(entry.age())}s old)")
+            return entry
+        if not value:
+            return None
+        return self.set(kind, key, value, amount)
+
+    def refresh_in_background(
+        self, kind: str, key: str, loader: Callable[[], Any], amount: Optional[int] = None
+    ) -> None:
+        """Schedule a refresh of (kind, key) unless one is already pending or refreshes are off"""
+        if not self.background_refresh:
+            logger.info(f"Background refreshes are off, not refreshing {kind} {key}")
+            return
+        with self._lock:
+            if (kind, key) in self._refreshing:
+                return
+            self._refreshing.add((kind, key))
+        self._executor.submit(self._refresh, kind, key, loader, amount)
+
+    def _refresh(self, kind: str, key: str, loader: Callable[[], Any], amount: Optional[int] = None) -> None:
+        try:
+            with background_priority():
+                value = loader()
+            if value:
+                self.set(kind, key, value, amount)
+        except Exception as e:
+            logger.error(f"Background refresh of {kind} {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard((kind, key))
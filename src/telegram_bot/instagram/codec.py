@@ -0,0 +1,67 @@
+import json
+import logging
+import zlib
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# Supported compressions of encoded cache values
+COMPRESSIONS = ("none", "zlib", "zstd")
+
+# Every zstd frame starts with these bytes, zlib streams with 0x78 and JSON with neither
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZLIB_HEADER = b"\x78"
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a value to UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def resolve_compression(compression: str) -> str:
+    """Validate a compression name, falling back to zlib when zstd is not installed"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown cache compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, compressing the cache with zlib")
+        return "zlib"
+    return compression
+
+
+def encode(value: Any, compression: str = "zlib") -> bytes:
+    """Serialize and compress a value, the compression is recognizable from the bytes"""
+    data = dumps(value)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    if compression == "zlib":
+        return zlib.compress(data)
+    return data
+
+
+def decode(data: bytes) -> Any:
+    """Inverse of encode for any compression, plain JSON included"""
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("zstd compressed cache value but zstandard is not installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif data[:1] == ZLIB_HEADER:
+        data = zlib.decompress(data)
+    return loads(data)
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Request priority lanes, lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Seconds between checks of an asyncio waiter while all request slots are taken
+ASYNC_POLL_INTERVAL = 0.05
+
+_priority: ContextVar[int] = ContextVar("api_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    """Priority lane of API requests made from the current thread or task"""
+    return _priority.get()
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Run API requests in the block in the background lane"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Call:
+    """In-flight call shared by every caller with the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function, callers arriving while it is
+    in flight block until it finishes and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            logger.info(f"Joining in-flight request {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Asyncio counterpart of ``SingleFlight`` for coroutines on one event loop
+
+    The call runs in its own task that every caller awaits shielded, so a
+    cancelled caller does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            logger.info(f"Joining in-flight request {key}")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+@dataclass
+class LaneStats:
+    """Wait time counters of one priority lane"""
+
+    acquired: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+
+class RateLimiter:
+    """Token bucket combined with a cap on requests in flight
+
+    Callers in a lower priority lane wait while any caller in a higher priority
+    lane is waiting, so interactive requests overtake queued background ones.
+    """
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiting = {lane: 0 for lane in LANE_NAMES}
+        self._stats = {lane: LaneStats() for lane in LANE_NAMES}
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _can_proceed(self, priority: int) -> bool:
+        if any(self._waiting[lane] for lane in self._waiting if lane < priority):
+            return False
+        return self.in_flight < self.max_in_flight and self._tokens >= 1
+
+    def acquire(self, priority: int = INTERACTIVE) -> float:
+        """Block until a request may be sent, return the time waited in seconds"""
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._can_proceed(priority):
+                        break
+                    # Sleep until the next token unless woken up by a release
+                    timeout = None if self._tokens >= 1 else (1 - self._tokens) / self.rate
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting[priority] -= 1
+            return self._take(priority, start)
+
+    async def acquire_async(self, priority: int = INTERACTIVE) -> float:
+        """Asyncio counterpart of ``acquire``, waits on the event loop instead of a thread
+
+        A cancelled waiter leaves the queue without taking a slot.
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    self._refill()
+                    if self._can_proceed(priority):
+                        self._waiting[priority] -= 1
+                        return self._take(priority, start)
+                    delay = ASYNC_POLL_INTERVAL if self._tokens >= 1 else (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+        except BaseException:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+            raise
+
+    def _take(self, priority: int, start: float) -> float:
+        """Take a token and a request slot, called with the condition held"""
+        self._tokens -= 1
+        self.in_flight += 1
+
+        waited = time.monotonic() - start
+        stats = self._stats[priority]
+        stats.acquired += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        # Lower priority callers may proceed now that this one left the queue
+        self._cond.notify_all()
+        return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def limit(self, priority: Optional[int] = None) -> Iterator[None]:
+        """Hold a request slot for the duration of the block"""
+        self.acquire(current_priority() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict[str, LaneStats]:
+        """Snapshot of the wait counters per lane"""
+        with self._cond:
+            return {LANE_NAMES[lane]: replace(stats) for lane, stats in self._stats.items()}
@@ -0,0 +1,260 @@
+"""Local stand-in for HikerAPI, for benchmarks and load tests that must not spend credits.
+
+``FakeHikerAPIServer`` serves the endpoints the bot uses from synthetic or
+recorded fixtures, with injectable latency, errors, 429 responses and private
+or missing accounts. ``FakeClient`` replaces ``hikerapi.Client`` and talks to it:
+
+    api = FakeHikerAPI.synthetic(n_users=100, latency={"distribution": "lognormal", "median": 0.3})
+    with FakeHikerAPIServer(api) as server:
+        wrapper = create_fake_wrapper(server.url)
+        wrapper.fetch_user_reels(wrapper.get_user_info("user0")["data"])
+"""
+
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from .service import InstagramWrapper
+
+logger = logging.getLogger(__name__)
+
+
+def sample_latency(spec: Optional[dict], rng: random.Random) -> float:
+    """Seconds to wait before answering, drawn from a latency spec
+
+    Specs are ``{"distribution": "fixed", "seconds": s}``,
+    ``{"distribution": "uniform", "low": a, "high": b}`` or
+    ``{"distribution": "lognormal", "median": m, "sigma": s}``.
+    """
+    if not spec:
+        return 0.0
+    distribution = spec["distribution"]
+    if distribution == "fixed":
+        return spec["seconds"]
+    if distribution == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if distribution == "lognormal":
+        return rng.lognormvariate(math.log(spec["median"]), spec.get("sigma", 0.5))
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+def make_user(username: str, pk: str, is_private: bool = False, follower_count: int = 1000) -> dict:
+    return {"username": username, "pk": pk, "is_private": is_private, "follower_count": follower_count}
+
+
+def make_media(owner: str, pk: str, taken_at: datetime, play_count: int, rng: random.Random) -> dict:
+    return {
+        "pk": pk,
+        "id": f"{pk}_{owner}",
+        "code": f"C{pk}",
+        "media_type": 2,
+        "title": "",
+        "caption_text": f"Reel {pk} of {owner}",
+        "like_count": int(play_count * rng.uniform(0.01, 0.1)),
+        "comment_count": int(play_count * rng.uniform(0.0005, 0.005)),
+        "play_count": play_count,
+        "taken_at": taken_at.isoformat().replace("+00:00", "Z"),
+        "video_url": f"https://example.com/{pk}.mp4",
+        "user": {"username": owner},
+    }
+
+
+class FakeHikerAPI:
+    """Fixtures and fault injection behind the fake server
+
+    Args:
+        users: User payloads by username. Unknown usernames are not found
+        clips: Medias by user pk, newest first
+        hashtags: Top medias by hashtag name
+        balance: Amount reported by ``/sys/balance``
+        latency: Latency spec, see ``sample_latency``
+        error_rate: Share of requests answered with 500
+        rate_limit_rate: Share of requests answered with 429
+        page_size: Medias per page of the clips chunk endpoint
+        seed: Seed of the latency and fault draws, for reproducible runs
+    """
+
+    def __init__(
+        self,
+        users: Optional[dict[str, dict]] = None,
+        clips: Optional[dict[str, list]] = None,
+        hashtags: Optional[dict[str, list]] = None,
+        balance: float = 100.0,
+        latency: Optional[dict] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        page_size: int = 12,
+        seed: Optional[int] = None,
+    ):
+        self.users = dict(users or {})
+        self.clips = dict(clips or {})
+        self.hashtags = dict(hashtags or {})
+        self.balance = balance
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.page_size = page_size
+        self.requests = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def synthetic(
+        cls, n_users: int = 10, n_clips: int = 30, private: int = 0, seed: int = 0, **kwargs
+    ) -> "FakeHikerAPI":
+        """Generate ``user0``..``userN`` with daily reels, the first ``private`` accounts are private"""
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        users, clips = {}, {}
+        for index in range(n_users):
+            username, pk = f"user{index}", str(1000 + index)
+            users[username] = make_user(username, pk, is_private=index < private, follower_count=rng.randint(100, 10**6))
+            clips[pk] = [
+                make_media(username, f"{pk}{day:04d}", now - timedelta(days=day), rng.randint(100, 10**6), rng)
+                for day in range(n_clips)
+            ]
+        hashtags = {"trend": [media for medias in clips.values() for media in medias[:2]]}
+        return cls(users=users, clips=clips, hashtags=hashtags, seed=seed, **kwargs)
+
+    @classmethod
+    def from_fixture(cls, path: str, **kwargs) -> "FakeHikerAPI":
+        """Load fixtures from a JSON file with ``users``, ``clips`` and ``hashtags`` objects"""
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        return cls(
+            users={user["username"]: user for user in fixture.get("users", [])},
+            clips=fixture.get("clips", {}),
+            hashtags=fixture.get("hashtags", {}),
+            **kwargs,
+        )
+
+    def _draw(self, path: str) -> tuple[float, float]:
+        with self._lock:
+            self.requests[path] += 1
+            return sample_latency(self.latency, self._rng), self._rng.random()
+
+    def handle(self, path: str, params: dict[str, str]) -> tuple[int, float, Any]:
+        """Answer a request: (status, latency in seconds, JSON body)"""
+        latency, draw = self._draw(path)
+        if draw < self.rate_limit_rate:
+            return 429, latency, {"detail": "Too many requests"}
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500, latency, {"detail": "Internal server error"}
+
+        if path == "/sys/balance":
+            return 200, latency, {"amount": self.balance, "currency": "USD"}
+        if path == "/v1/user/by/username":
+            user = self.users.get(params.get("username"))
+            if user is None:
+                return 404, latency, {"detail": "Target user not found", "exc_type": "UserNotFound"}
+            return 200, latency, user
+        if path == "/v1/user/clips":
+            amount = int(params.get("amount", 50))
+            return 200, latency, self._user_clips(params.get("user_id"))[:amount]
+        if path == "/v1/user/clips/chunk":
+            medias = self._user_clips(params.get("user_id"))
+            start = int(params.get("end_cursor") or 0)
+            end = start + self.page_size
+            return 200, latency, [medias[start:end], str(end) if end < len(medias) else None]
+        if path == "/v1/hashtag/medias/top":
+            amount = int(params.get("amount", 50))
+            return 200, latency, self.hashtags.get(params.get("name"), [])[:amount]
+        return 404, latency, {"detail": "Not Found"}
+
+    def _user_clips(self, user_pk: Optional[str]) -> list:
+        user = next((user for user in self.users.values() if user["pk"] == user_pk), None)
+        if user is None or user.get("is_private"):
+            return []
+        return self.clips.get(user_pk, [])
+
+
+class FakeHikerAPIServer:
+    """Threaded HTTP server answering with a ``FakeHikerAPI`` on a local port"""
+
+    def __init__(self, api: FakeHikerAPI, host: str = "127.0.0.1", port: int = 0):
+        self.api = api
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                status, latency, body = api.handle(url.path, params)
+                time.sleep(latency)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):  # noqa: A002
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeHikerAPIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeHikerAPIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class FakeClient:
+    """Drop-in replacement of ``hikerapi.Client`` for the methods the bot calls
+
+    Like the real client it returns the JSON body of error answers, except for
+    429 and 5xx answers which raise ``httpx.HTTPStatusError`` so that the
+    wrapper's retries and circuit breaker are exercised.
+    """
+
+    def __init__(self, base_url: str, token: str = "fake", timeout: float = 10):
+        self._client = httpx.Client(base_url=base_url, headers={"x-access-key": token}, timeout=timeout)
+
+    def _get(self, path: str, **params) -> Any:
+        response = self._client.get(path, params={name: value for name, value in params.items() if value})
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response.json()
+
+    def user_by_username_v1(self, username: str) -> dict:
+        return self._get("/v1/user/by/username", username=username)
+
+    def user_clips_v1(self, user_id: str, amount: int = 50) -> list:
+        return self._get("/v1/user/clips", user_id=user_id, amount=amount)
+
+    def user_clips_chunk_v1(self, user_id: str, end_cursor: Optional[str] = None) -> list:
+        return self._get("/v1/user/clips/chunk", user_id=user_id, end_cursor=end_cursor)
+
+    def hashtag_medias_top_v1(self, name: str, amount: int = 50) -> list:
+        return self._get("/v1/hashtag/medias/top", name=name, amount=amount)
+
+
+def create_fake_wrapper(base_url: str) -> InstagramWrapper:
+    """InstagramWrapper whose client and balance requests go to a fake server"""
+    return InstagramWrapper("fake", client=FakeClient(base_url), base_url=base_url)
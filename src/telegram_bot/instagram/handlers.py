@@ -8,7 +8,10 @@ from telebot.states import State, StatesGroup
 from telebot.types import CallbackQuery, InputMediaVideo, Message
 
 from ..common.markup import create_cancel_button, create_keyboard_markup
-from .service import InstagramWrapper
+from .budget import spending_user
+from .cache import NO_REELS, NOT_FOUND, PRIVATE
+from .reels import Reel
+from .service import get_instagram_wrapper
 from .utils import create_resource, sanitize_instagram_input
 
 logger = logging.getLogger(__name__)
@@ -25,7 +28,7 @@ HIKERAPI_TOKEN = os.getenv("HIKERAPI_TOKEN")
 if not HIKERAPI_TOKEN:
     raise ValueError("HIKERAPI_TOKEN not found in environment variables")
 
-instagram_client = InstagramWrapper(HIKERAPI_TOKEN)
+instagram_client = get_instagram_wrapper(HIKERAPI_TOKEN)
 
 # Define States
 class AnalyzeAccountStates(StatesGroup):
@@ -34,20 +37,20 @@ class AnalyzeAccountStates(StatesGroup):
 
 def format_account_reel_response(
     idx: int,
-    reel: dict[str, str],
+    reel: Reel,
     template: str,
     average_likes: float,
     average_comments: float
     ) -> str:
 
-    likes_diff = int(reel["likes"] - average_likes)
+    likes_diff = int(reel.likes - average_likes)
     likes_comparative = (
         config.strings.comparative_less["ru"].format(value=f"{abs(likes_diff):,}".replace(",", " "))
         if likes_diff < 0 else
         config.strings.comparative_more["ru"].format(value=f"{likes_diff:,}".replace(",", " "))
     )
 
-    comments_diff = int(reel["comments"] - average_comments)
+    comments_diff = int(reel.comments - average_comments)
     comments_comparative = (
         config.strings.comparative_less["ru"].format(value=f"{abs(comments_diff):,}".replace(",", " "))
         if comments_diff < 0 else
@@ -56,12 +59,12 @@ def format_account_reel_response(
 
     reel_response = template.format(
         idx=idx,
-        likes=f"{reel['likes']:,}".replace(",", " "),
+        likes=f"{reel.likes:,}".replace(",", " "),
         likes_comparative=likes_comparative,
-        comments=f"{reel['comments']:,}".replace(",", " "),
+        comments=f"{reel.comments:,}".replace(",", " "),
         comments_comparative=comments_comparative,
-        link=reel["link"],
-        views=f"{reel['play_count']:,}".replace(",", " ")
+        link=reel.link,
+        views=f"{reel.play_count:,}".replace(",", " ")
     )
     return reel_response
 
@@ -108,9 +111,27 @@ def register_handlers(bot):
 
         logger.info(f"Fetching reels for account {user_input}")
 
-        response = instagram_client.get_user_info(username=user_input)
+        # Accounts that recently turned out unusable are answered without an API call
+        negative_reason = instagram_client.get_negative_reason(user_input)
+        if negative_reason:
+            logger.info(f"Account {user_input} is cached as {negative_reason}")
+            reason_messages = {
+                NOT_FOUND: config.strings.no_found,
+                PRIVATE: config.strings.private_account,
+                NO_REELS: config.strings.no_reels,
+            }
+            bot.send_message(message.chat.id, reason_messages[negative_reason][user.lang])
+            data["state"].delete()
+            return
+
+        with spending_user(user.id):
+            response = instagram_client.get_user_info(username=user_input)
 
-        if response["status"] != 200:
+        if response["status"] == 503:
+            bot.send_message(message.chat.id, config.strings.budget_exhausted[user.lang])
+            data["state"].delete()
+            return
+        elif response["status"] != 200:
             bot.send_message(message.chat.id, config.strings.no_found[user.lang])
             logger.info(f"Error fetching reels for account {user_input}")
             data["state"].delete()
@@ -141,11 +162,14 @@ def register_handlers(bot):
         with data["state"].data() as data_items:
             input_text = data_items['user_input']
             account_user = data_items["account_user"]
-        response = instagram_client.fetch_user_reels(account_user)
+        with spending_user(user.id):
+            response = instagram_client.fetch_user_reels(
+                account_user, n_media_items=max(number_of_videos, config.analysis.min_media_items)
+            )
 
         if response["status"] == 200:
             reels_data = response["data"]
-            reels_data.sort(key=lambda x: x["play_count"], reverse=True)
+            reels_data.sort(key=lambda x: x.play_count, reverse=True)
 
             logger.info(f"Found {len(reels_data)} reels for account {input_text}")
 
@@ -155,8 +179,8 @@ def register_handlers(bot):
             response_template = config.strings.results[user.lang]
 
             # Compute average values for likes and comments
-            average_likes = sum([reel["likes"] for reel in reels_data]) / len(reels_data)
-            average_comments = sum([reel["comments"] for reel in reels_data]) / len(reels_data)
+            average_likes = sum([reel.likes for reel in reels_data]) / len(reels_data)
+            average_comments = sum([reel.comments for reel in reels_data]) / len(reels_data)
 
             reel_response_items = [
                 format_account_reel_response(
@@ -171,14 +195,15 @@ def register_handlers(bot):
 
             data_list = [
                 {
-                    "Url": reel["link"],
-                    "Likes": reel["likes"],
-                    "Comments": reel["comments"],
-                    "Views": reel["play_count"],
-                    "Post Date": reel["post_date"],
-                    "ER %": reel["er"] * 100,
-                    "Owner": f'@{reel["owner"]}',
-                    "Caption": reel["caption_text"]
+                    "Url": reel.link,
+                    "Likes": reel.likes,
+                    "Comments": reel.comments,
+                    "Views": reel.play_count,
+                    # Excel has no time zones, the report shows UTC times
+                    "Post Date": reel.post_date.replace(tzinfo=None) if reel.post_date else None,
+                    "ER %": reel.er * 100,
+                    "Owner": f'@{reel.owner}',
+                    "Caption": reel.caption_text
                 }
                 for reel in reels_data
             ]
@@ -204,7 +229,7 @@ def register_handlers(bot):
             media_elements = []
             for reel in reels_data[:3]:
                 media_elements.append(
-                    InputMediaVideo(media=str(reel["video_url"]), caption=reel["title"])
+                    InputMediaVideo(media=str(reel.video_url), caption=reel.title)
                 )
             if media_elements:
                 bot.send_media_group(
@@ -223,6 +248,10 @@ def register_handlers(bot):
         else:
             if response["status"] == 403:
                 bot.send_message(call.message.chat.id, config.strings.private_account[user.lang])
+            elif response["status"] == 402:
+                bot.send_message(call.message.chat.id, config.strings.no_reels[user.lang])
+            elif response["status"] == 503:
+                bot.send_message(call.message.chat.id, config.strings.budget_exhausted[user.lang])
             else:
                 bot.send_message(call.message.chat.id, config.strings.error[user.lang])
             data["state"].delete()
@@ -0,0 +1,34 @@
+"""Rewrite the Instagram cache with the configured backend and compression.
+
+Usage: python -m telegram_bot.instagram.migrate_cache [file|sqlite]
+
+The optional argument names the backend to read from, by default the configured
+one, which is then recompressed in place.
+"""
+
+import logging
+import sys
+
+from .cache import FileCache, SQLiteCache
+from .service import config, create_cache
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_cache(source_backend: str = None) -> int:
+    """Rewrite every entry of ``source_backend`` into the configured cache, return how many"""
+    cache = create_cache()
+    if source_backend is None or source_backend == config.cache.backend:
+        source = cache.backend
+    elif source_backend == "sqlite":
+        source = SQLiteCache(config.cache.sqlite_path)
+    else:
+        source = FileCache(config.cache.dir)
+    migrated = cache.migrate_from(source)
+    logger.info(f"Rewrote {migrated} cache entries into the {config.cache.backend} backend")
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate_cache(sys.argv[1] if len(sys.argv) > 1 else None)
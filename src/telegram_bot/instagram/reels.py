@@ -0,0 +1,174 @@
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Media types HikerAPI uses for videos and carousels that may hold reels
+REEL_MEDIA_TYPES = {2, 8}
+
+# Version of the projected media layout stored in the cache, bump when MEDIA_FIELDS changes
+MEDIA_SCHEMA = 1
+# Raw media fields the bot reads, everything else is dropped before caching
+MEDIA_FIELDS = (
+    "pk",
+    "id",
+    "code",
+    "media_type",
+    "title",
+    "caption_text",
+    "like_count",
+    "comment_count",
+    "play_count",
+    "taken_at",
+    "video_url",
+)
+
+
+def project_media(media: dict) -> dict:
+    """Keep only the fields of a raw media the bot uses"""
+    projected = {field: media.get(field) for field in MEDIA_FIELDS}
+    user = media.get("user")
+    if user:
+        projected["user"] = {"username": user["username"]}
+    # Set on cached medias kept through a partial refresh, see InstagramWrapper._load_user_clips_incremental
+    if media.get("fetched_at") is not None:
+        projected["fetched_at"] = media["fetched_at"]
+    return projected
+
+
+def project_medias(media_list: list) -> list:
+    return [project_media(media) for media in media_list]
+
+
+def parse_taken_at(taken_at) -> Optional[float]:
+    """Epoch seconds of a media's ``taken_at``, given as ISO string or number, None when missing
+
+    ISO strings without an offset are read as UTC, not as the host's local time.
+    """
+    if taken_at is None or taken_at == "":
+        return None
+    if isinstance(taken_at, str):
+        parsed = datetime.fromisoformat(taken_at.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return float(taken_at)
+
+
+class Reel:
+    """Normalized reel as used by the handlers, reports and trend analysis
+
+    Only raw fields are stored, the link, engagement rate and post date are
+    derived on access. ``posted_at`` is parsed once from the media's ``taken_at``.
+    """
+
+    __slots__ = (
+        "pk",
+        "id",
+        "code",
+        "title",
+        "caption_text",
+        "likes",
+        "comments",
+        "play_count",
+        "posted_at",
+        "video_url",
+        "owner",
+        "fetched_at",
+    )
+
+    def __init__(
+        self,
+        pk: str,
+        id: str,  # noqa: A002
+        code: str,
+        title: str,
+        caption_text: str,
+        likes: int,
+        comments: int,
+        play_count: int,
+        posted_at: Optional[float],
+        video_url: str,
+        owner: str,
+        fetched_at: Optional[float] = None,
+    ):
+        self.pk = pk
+        self.id = id
+        self.code = code
+        self.title = title
+        self.caption_text = caption_text
+        self.likes = likes
+        self.comments = comments
+        self.play_count = play_count
+        # Epoch seconds, None when the media has no post time, NaN when it is invalid
+        self.posted_at = posted_at
+        self.video_url = video_url
+        self.owner = owner
+        # Epoch seconds the metrics were read from the API
+        self.fetched_at = fetched_at
+
+    def __repr__(self) -> str:
+        return f"Reel(pk={self.pk!r}, owner={self.owner!r}, play_count={self.play_count})"
+
+    @property
+    def link(self) -> str:
+        return f"https://www.instagram.com/reel/{self.code}/"
+
+    @property
+    def post_date(self) -> Optional[datetime]:
+        """Post time as an aware UTC datetime"""
+        if self.posted_at is None or math.isnan(self.posted_at):
+            return None
+        return datetime.fromtimestamp(self.posted_at, timezone.utc)
+
+    @property
+    def er(self) -> float:
+        """Engagement rate: likes and comments per view"""
+        if not self.play_count:
+            return 0
+        return (self.likes + self.comments) / self.play_count
+
+
+def normalize_media(media_list: list, owner: Optional[str] = None, fetched_at: Optional[float] = None) -> list[Reel]:
+    """Convert raw HikerAPI medias into reels, skipping non-video and unviewed medias
+
+    Args:
+        media_list: Medias as returned by the clips or hashtag endpoints
+        owner: Username of the account the medias belong to. Read from each
+            media's user object when not given
+        fetched_at: Epoch seconds the medias were fetched, now when not given.
+            Medias with their own ``fetched_at`` keep it
+
+    Returns:
+        The reels in the order of ``media_list``
+    """
+    fetched_at = fetched_at if fetched_at is not None else time.time()
+    reels = []
+    for media in media_list:
+        if media["media_type"] not in REEL_MEDIA_TYPES or not media["play_count"]:
+            continue
+        try:
+            posted_at = parse_taken_at(media["taken_at"])
+        except ValueError:
+            logger.warning(f"Invalid taken_at {media['taken_at']!r} of media {media['pk']}")
+            posted_at = math.nan
+        reels.append(
+            Reel(
+                pk=media["pk"],
+                id=media["id"],
+                code=media["code"],
+                title=media["title"],
+                caption_text=media["caption_text"],
+                likes=media["like_count"],
+                comments=media["comment_count"],
+                play_count=media["play_count"],
+                posted_at=posted_at,
+                video_url=media["video_url"],
+                owner=owner or media["user"]["username"],
+                fetched_at=media.get("fetched_at") or fetched_at,
+            )
+        )
+    return reels
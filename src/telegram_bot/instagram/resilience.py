@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: throttling and provider-side failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+class UnexpectedAnswerError(Exception):
+    """Raised when the API answers with an error body instead of the requested object"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Tell transient provider failures from errors a retry cannot fix"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUSES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def raise_for_retryable_status(response: httpx.Response) -> None:
+    """httpx response hook raising ``httpx.HTTPStatusError`` for throttling and provider failures
+
+    ``hikerapi.Client`` returns error answers as bodies instead of raising, the
+    hook lets them reach the retry policy and the circuit breaker.
+    """
+    if response.status_code in RETRYABLE_STATUSES:
+        response.raise_for_status()
+
+
+def install_status_hook(session: Any) -> None:
+    """Add ``raise_for_retryable_status`` to an ``httpx.Client``, other objects are left alone"""
+    if isinstance(session, httpx.Client) and raise_for_retryable_status not in session.event_hooks["response"]:
+        session.event_hooks = {
+            **session.event_hooks,
+            "response": [*session.event_hooks["response"], raise_for_retryable_status],
+        }
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter for retryable errors"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after the given (zero-based) failed attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        return is_retryable_error(error) and attempt + 1 < self.max_attempts
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        for attempt in range(self.max_attempts):
+            try:
+                return fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"HikerAPI request failed: {e}. Retrying in {delay:.2f}s...")
+                time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self.max_attempts):
+            try:
+                return await fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"HikerAPI request failed: {e}. Retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Fail fast once the recent error rate of the API passes a threshold
+
+    The breaker tracks the outcome of the last ``window`` calls. When at least
+    ``min_calls`` were made and the share of failures reaches ``failure_rate``
+    it opens and rejects calls for ``reset_timeout`` seconds. Then a single
+    trial call is let through: success closes the breaker, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        reset_timeout: float = 60,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` if a call may not be made now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError("HikerAPI circuit breaker is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._outcomes.append(True)
+            if self.state != self.CLOSED:
+                logger.info("HikerAPI circuit breaker closed")
+                self.state = self.CLOSED
+                self._trial_in_flight = False
+                self._outcomes.clear()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._outcomes.append(False)
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self) -> None:
+        logger.warning(f"HikerAPI circuit breaker opened for {self.reset_timeout}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def record_neutral(self) -> None:
+        """Record a call that says nothing about the provider's health, a half-open breaker lets another trial through"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, error: BaseException) -> None:
+        """Record the outcome of a call that raised ``error``"""
+        if is_retryable_error(error):
+            self.record_failure()
+        else:
+            # The request itself was wrong, neither a success nor a failure of the provider
+            self.record_neutral()
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        self.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            self.record(e)
+            raise
+        self.record_success()
+        return result
@@ -1,157 +1,441 @@
-from email.mime import application
-import json
-import httpx
 import logging
-import os
-from time import sleep
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
 
+import httpx
 from hikerapi import Client
+from omegaconf import OmegaConf
+
+from .budget import BudgetExceededError, BudgetManager
+from .cache import (
+    NO_REELS,
+    NOT_FOUND,
+    PRIVATE,
+    CacheEntry,
+    FileCache,
+    InstagramCache,
+    MemoryCache,
+    RawArchive,
+    SQLiteCache,
+)
+from .concurrency import RateLimiter, SingleFlight, current_priority
+from .reels import MEDIA_SCHEMA, Reel, normalize_media, parse_taken_at, project_medias
+from .resilience import CircuitBreaker, RetryPolicy, UnexpectedAnswerError, install_status_hook
+from .traffic import TrafficRecorder, TrafficReplayer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load configuration
+CURRENT_DIR = Path(__file__).parent
+config = OmegaConf.load(CURRENT_DIR / "config.yaml")
+
+
+# Shared by every wrapper in the process so all HikerAPI traffic is paced together
+api_limiter = RateLimiter(
+    rate=config.rate_limit.requests_per_second,
+    burst=config.rate_limit.burst,
+    max_in_flight=config.rate_limit.max_in_flight,
+)
+
+api_retry_policy = RetryPolicy(
+    max_attempts=config.retry.max_attempts,
+    base_delay=config.retry.base_delay,
+    max_delay=config.retry.max_delay,
+)
+api_breaker = CircuitBreaker(
+    failure_rate=config.circuit_breaker.failure_rate,
+    window=config.circuit_breaker.window,
+    min_calls=config.circuit_breaker.min_calls,
+    reset_timeout=config.circuit_breaker.reset_timeout,
+)
+
+api_budget = BudgetManager(
+    costs=config.budget.costs,
+    low_balance=config.budget.low_balance,
+    saving_balance=config.budget.saving_balance,
+    critical_balance=config.budget.critical_balance,
+    ttl_multiplier=config.budget.ttl_multiplier,
+    trend_account_limit=config.budget.trend_account_limit,
+)
+
+
+def create_cache() -> InstagramCache:
+    """Build the TTL disk cache from the configuration"""
+    if config.cache.backend == "sqlite":
+        backend = SQLiteCache(config.cache.sqlite_path, compression=config.cache.compression)
+    else:
+        backend = FileCache(config.cache.dir, compression=config.cache.compression)
+    return InstagramCache(
+        backend,
+        ttl=config.cache.ttl,
+        stale_ttl=config.cache.stale_ttl,
+        negative_ttl=config.cache.negative_ttl,
+        refresh_workers=config.cache.refresh_workers,
+        projections={
+            "user_clips": (MEDIA_SCHEMA, project_medias),
+            "hashtag_top": (MEDIA_SCHEMA, project_medias),
+        },
+        archive=RawArchive(config.cache.archive.dir) if config.cache.archive.enabled else None,
+    )
+
+
+def create_memory_cache() -> MemoryCache:
+    """Build the in-memory tier for normalized reel lists from the configuration"""
+    return MemoryCache(
+        max_entries=config.cache.memory.max_entries,
+        max_bytes=config.cache.memory.max_bytes,
+    )
+
+
+def taken_at_timestamp(media: dict) -> float:
+    """Epoch seconds of a raw media's ``taken_at``, 0 when missing"""
+    return parse_taken_at(media["taken_at"]) or 0.0
+
+
+def is_user_not_found(answer: Any) -> bool:
+    """Whether a user lookup answer is HikerAPI's explicit not-found error"""
+    return isinstance(answer, dict) and answer.get("exc_type") == "UserNotFound"
+
+
+def merge_media(cached: list, fetched: list, limit: int) -> list:
+    """Merge freshly fetched medias into a cached list, newest first
+
+    Fetched medias replace cached ones with the same pk, so their metrics are updated.
+    """
+    by_pk = {media["pk"]: media for media in cached}
+    by_pk.update((media["pk"], media) for media in fetched)
+    return sorted(by_pk.values(), key=taken_at_timestamp, reverse=True)[:limit]
+
+
 class InstagramWrapper:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client: Optional[Any] = None, base_url: Optional[str] = None):
         self.token = token
-        self.client = Client(token=token)
+        # Any object with the hikerapi.Client methods used below, e.g. fake_hikerapi.FakeClient
+        self.client = client or Client(token=token)
         self.use_cache = True
+        self.http = httpx.Client(
+            base_url=base_url or config.http.base_url,
+            headers={"x-access-key": token, "accept": "application/json"},
+            timeout=config.http.timeout,
+        )
+        # Error answers come back as bodies, make throttling and provider failures raise
+        install_status_hook(getattr(self.client, "_client", None))
+        install_status_hook(self.http)
+        self.cache = create_cache()
+        # Normalized reel lists, kept in front of the disk cache
+        self.memory = create_memory_cache()
+        # Concurrent identical API requests share a single call
+        self.single_flight = SingleFlight()
+        self.limiter = api_limiter
+        self.retry_policy = api_retry_policy
+        self.breaker = api_breaker
+        self.budget = api_budget
+        self.budget.attach(self.cache)
+        if config.traffic.mode == "record":
+            self.record_traffic(config.traffic.archive)
+        elif config.traffic.mode == "replay":
+            self.replay_traffic(config.traffic.archive, config.traffic.replay_speed)
+
+    def record_traffic(self, path: str) -> None:
+        """Append every HikerAPI call with its answer and timing to a gzip JSON lines archive"""
+        recorder = TrafficRecorder(path)
+        self.client = recorder.proxy(self.client, "client")
+        self.http = recorder.proxy(self.http, "http")
+
+    def replay_traffic(self, path: str, speed: Optional[float] = None) -> None:
+        """Answer HikerAPI calls from a recorded archive instead of the network
+
+        Args:
+            path: Archive written in record mode
+            speed: Recorded latencies are divided by it, None answers without waiting
+        """
+        replayer = TrafficReplayer(path, speed)
+        self.client = replayer.proxy(self.client, "client")
+        self.http = replayer.proxy(self.http, "http")
+
+    def _call_api(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call HikerAPI through the circuit breaker, retrying transient failures
+
+        The request is refused if the budget does not allow it, every attempt
+        waits for a slot of the shared rate limiter and is charged to the budget.
+        """
+        self.budget.check(kind, current_priority())
+
+        def attempt():
+            with self.limiter.limit():
+                result = fn(*args, **kwargs)
+            self.budget.charge(kind)
+            return result
+
+        return self.retry_policy.call(lambda: self.breaker.call(attempt))
+
+    def _get_reels(
+        self,
+        kind: str,
+        key: str,
+        loader: Callable[[], Any],
+        normalize: Callable[..., list[Reel]],
+        stale_ok: bool,
+        amount: Optional[int] = None,
+    ) -> Optional[list[Reel]]:
+        """Return normalized reels from the memory tier, the disk tier or the API
+
+        Entries fetched for at least ``amount`` medias are reused, the newest
+        ``amount`` reels of them are returned.
+        """
+        if not self.use_cache:
+            media_list = loader()
+            return normalize(media_list, fetched_at=time.time()) if media_list else None
+
+        entry = self.memory.get(kind, key)
+        if entry is None or not entry.covers(amount) or not self.cache.is_fresh(kind, entry):
+            raw_entry = self.cache.get_or_load(kind, key, loader, stale_ok, amount)
+            if raw_entry is None:
+                return None
+            reels = normalize(raw_entry.value, fetched_at=raw_entry.fetched_at)
+            entry = CacheEntry(reels, raw_entry.fetched_at, amount=raw_entry.amount)
+            self.memory.set(kind, key, entry)
+        # Callers sort the list in place
+        return list(entry.value[:amount])
+
+    def _fetch_amount(self, kind: str, key: str, n_media_items: int) -> int:
+        """Medias to request: never fewer than the cached entry holds, so refreshes do not shrink it"""
+        cached = self.cache.get(kind, key) if self.use_cache else None
+        return max(n_media_items, cached.size()) if cached else n_media_items
+
+    def warm_user_clips(self, usernames: list[str]) -> int:
+        """Bulk-read the cached clips of many accounts into the memory tier, return how many were fresh"""
+        if not self.use_cache:
+            return 0
+        warmed = 0
+        for username, raw_entry in self.cache.get_many("user_clips", usernames).items():
+            if not self.cache.is_fresh("user_clips", raw_entry):
+                continue
+            reels = normalize_media(raw_entry.value, owner=username, fetched_at=raw_entry.fetched_at)
+            self.memory.set("user_clips", username, CacheEntry(reels, raw_entry.fetched_at, amount=raw_entry.amount))
+            warmed += 1
+        return warmed
+
+    def get_negative_reason(self, username: str) -> Optional[str]:
+        """Reason code if the account recently turned out missing, private or without reels"""
+        if not self.use_cache:
+            return None
+        return self.cache.get_negative("user_negative", username)
+
+    def _remember_negative(self, kind: str, key: str, reason: str) -> None:
+        if self.use_cache:
+            logger.info(f"Remembering {key} as {reason}")
+            self.cache.set_negative(kind, key, reason)
 
     def get_balance(self):
-        headers = {
-            "x-access-key": self.token,
-            "accept": "application/json",
-        }
-        response = httpx.get("https://api.hikerapi.com/sys/balance", headers=headers)
+        try:
+            response = self._call_api("balance", self.http.get, "/sys/balance")
+        except httpx.HTTPStatusError as e:
+            return {"status": e.response.status_code, "message": e.response.text}
         if response.status_code == 200:
             return {"status": 200, "data": response.json()}
         return {"status": response.status_code, "message": response.text}
 
-    def get_user_info(self, username: str):
-        user = self.client.user_by_username_v1(username)
+    def get_user_info(self, username: str, stale_ok: bool = True):
+        if self.get_negative_reason(username) == NOT_FOUND:
+            return {"status": 404, "message": "User not found"}
+
+        def fetch():
+            user = self._call_api("user_info", self.client.user_by_username_v1, username)
+            if isinstance(user, dict) and "pk" in user:
+                return user
+            # Only an explicit not-found answer is remembered, other error bodies are failures
+            if is_user_not_found(user):
+                return None
+            raise UnexpectedAnswerError(f"Unexpected user info answer for {username}: {str(user)[:200]}")
+
+        def load():
+            return self.single_flight.do(("user_info", username), fetch)
+
+        try:
+            if self.use_cache:
+                entry = self.cache.get_or_load("user_info", username, load, stale_ok)
+                user = entry.value if entry else None
+            else:
+                user = load()
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching user info for {username}: {e}")
+            return {"status": 500, "message": "Internal server error"}
         if not user:
+            self._remember_negative("user_negative", username, NOT_FOUND)
             return {"status": 404, "message": "User not found"}
         return {"status": 200, "data": user}
 
+    def _iter_user_clip_pages(self, user_id: str) -> Iterator[list]:
+        """Yield raw pages of user clips, newest first, requesting each page lazily"""
+        end_cursor = None
+        while True:
+            items, end_cursor = self._call_api(
+                "user_clips", self.client.user_clips_chunk_v1, user_id, end_cursor=end_cursor
+            )
+            if items:
+                yield items
+            if not items or not end_cursor:
+                return
+
+    def iter_user_reels(self, user, max_pages: Optional[int] = None) -> Iterator[list[Reel]]:
+        """Yield the reels of a user page by page, newest first
+
+        Each page is requested only when the previous one has been consumed, so
+        callers that need only recent reels stop early and save API calls. The
+        medias fetched are merged into the clips cache once the caller stops,
+        the entry counts as fresh only if every cached media was fetched again.
+        API errors, budget refusals included, are raised to the caller.
+
+        Args:
+            user: User payload with ``username``, ``pk`` and ``is_private``
+            max_pages: Stop after this many pages, all pages when None
+
+        Yields:
+            The normalized reels of one page, possibly empty
+        """
+        if user["is_private"]:
+            return
+        username = user["username"]
+        fetched = []
+        try:
+            for page_number, items in enumerate(self._iter_user_clip_pages(user["pk"]), start=1):
+                fetched.extend(items)
+                yield normalize_media(items, owner=username)
+                if max_pages is not None and page_number >= max_pages:
+                    return
+        finally:
+            if self.use_cache and fetched:
+                cached = self.cache.get("user_clips", username)
+                cached_medias = cached.value if cached else []
+                merged = merge_media(cached_medias, fetched, len(cached_medias) + len(fetched))
+                # Cached medias not paged again keep their old metrics, and so the entry its old age
+                fetched_pks = {media["pk"] for media in fetched}
+                partial = any(media["pk"] not in fetched_pks for media in cached_medias)
+                fetched_at = cached.fetched_at if partial else None
+                self.cache.set("user_clips", username, merged, amount=len(merged), fetched_at=fetched_at)
+                self.memory.delete("user_clips", username)
+
+    def _load_user_clips_incremental(self, user_id: str, cached: CacheEntry, n_media_items: int) -> list:
+        """Page through user clips only until already known medias are reached
+
+        Paging goes on past known medias while the page still holds reels of the
+        trend window, so their metrics are refreshed, and while fewer than
+        ``n_media_items`` medias are known. Older cached reels keep their metrics,
+        and with ``fetched_at`` the time those metrics were read.
+        """
+        known_pks = {media["pk"] for media in cached.value}
+        window_start = time.time() - config.incremental.window_days * 86400
+        fetched = []
+        fetched_pks = set()
+        reached_known = left_window = False
+        for page_number, items in enumerate(self._iter_user_clip_pages(user_id), start=1):
+            fetched.extend(items)
+            fetched_pks.update(media["pk"] for media in items)
+            reached_known = reached_known or any(media["pk"] in known_pks for media in items)
+            left_window = taken_at_timestamp(items[-1]) < window_start
+            # Larger requests than the cache holds page on for the missing older medias
+            enough = len(known_pks | fetched_pks) >= n_media_items
+            if (reached_known and left_window and enough) or page_number >= config.incremental.max_pages:
+                break
+        new_count = sum(media["pk"] not in known_pks for media in fetched)
+        logger.info(f"Incremental fetch of user {user_id}: {len(fetched)} medias, {new_count} new")
+        # Fetched medias replace their cached copies in the merge, so only the kept ones carry the old time
+        kept = [media if media.get("fetched_at") else {**media, "fetched_at": cached.fetched_at} for media in cached.value]
+        return merge_media(kept, fetched, max(n_media_items, len(kept)))
+
+    def _load_user_clips(self, username: str, user_id: str, n_media_items: int) -> list:
+        cached = self.cache.get("user_clips", username) if self.use_cache else None
+        if cached:
+            n_media_items = max(n_media_items, cached.size())
+        if config.incremental.enabled and cached and cached.value:
+            return self._load_user_clips_incremental(user_id, cached, n_media_items)
+        return self._call_api("user_clips", self.client.user_clips_v1, user_id, amount=n_media_items)
+
     def fetch_user_reels(
-            self, user, n_media_items: int = 25
+            self, user, n_media_items: int = 25, stale_ok: bool = True
         ):
-        
-        print(user)
-
         username = user["username"]
         user_id = user["pk"]
 
         logger.info(f"Fetching reels for user {username} (ID: {user_id})")
 
-        # Check cache
-        if self.use_cache and os.path.exists(f"cache/user/{username}/reels.json"):
-            with open(f"cache/user/{username}/reels.json", "r", encoding="utf-8") as f:
-                media_list = json.loads(f.read())
-                logger.info(f"Found reels for user {username} in cache")
-        else:
-            media_list = None
-
-        # Fetch reels if not in cache
-        if not media_list:
-            if user["is_private"]:
-                return {"status": 403, "message": "Account is private"}
-
-            try:
-                media_list = self.client.user_clips_v1(user_id, amount=n_media_items)
-            except Exception as e:
-                logger.error(f"Error fetching reels for user {username}: {e}. Retrying...")
-                # try again
-                sleep(1)
-                try:
-                    media_list = self.client.user_clips_v1(user_id, amount=n_media_items)
-                except Exception as e:
-                    logger.error(f"Error fetching reels for user {username}: {e}")
-                    return {"status": 500, "message": "Internal server error"}
-
-            if not media_list:
-                return {"status": 402, "message": "No reels found"}
-
-            # Save retrieved reels in cache folder
-            os.makedirs(f"cache/user/{username}", exist_ok=True)
-            with open(f"cache/user/{username}/reels.json", "w", encoding="utf-8") as f:
-                json.dump(media_list, f, ensure_ascii=False)
-
-        reels = []
-        for media in media_list:
-            if media["media_type"] in {2, 8} and media["play_count"] != 0:
-                if media["play_count"] != 0:
-                    er = (media["like_count"] + media["comment_count"]) / media["play_count"]
-                else:
-                    er = 0
-                reel_item = {
-                    "pk": media["pk"],
-                    "title": media["title"],
-                    "caption_text": media["caption_text"],
-                    "likes": media["like_count"],
-                    "comments": media["comment_count"],
-                    "post_date": media["taken_at"],
-                    "link": f"https://www.instagram.com/reel/{media['code']}/",
-                    "video_url": media["video_url"],
-                    "play_count": media["play_count"],
-                    "id": media["id"],
-                    "er": er,
-                    "owner": username,
-                }
-                reels.append(reel_item)
+        if user["is_private"]:
+            self._remember_negative("user_negative", username, PRIVATE)
+            return {"status": 403, "message": "Account is private"}
+        if self.get_negative_reason(username) == NO_REELS:
+            return {"status": 402, "message": "No reels found"}
+
+        def load():
+            return self.single_flight.do(
+                ("user_clips", username, user_id, n_media_items),
+                lambda: self._load_user_clips(username, user_id, n_media_items),
+            )
+
+        try:
+            reels = self._get_reels(
+                "user_clips",
+                username,
+                load,
+                lambda media_list, fetched_at: normalize_media(media_list, owner=username, fetched_at=fetched_at),
+                stale_ok,
+                n_media_items,
+            )
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching reels for user {username}: {e}")
+            return {"status": 500, "message": "Internal server error"}
+
+        if not reels:
+            self._remember_negative("user_negative", username, NO_REELS)
+            return {"status": 402, "message": "No reels found"}
+
         return {"status": 200, "data": reels}
 
-    def fetch_hashtag_reels(self, hashtag: str, n_media_items: int = 50):
-        # Check cache
-        if self.use_cache and os.path.exists(f"cache/hashtag/{hashtag}/reels.json"):
-            with open(f"cache/hashtag/{hashtag}/reels.json", "r", encoding="utf-8") as f:
-                media_list = json.loads(f.read())
-                logger.info(f"Found reels for hashtag {hashtag} in cache")
-        else:
-            media_list = None
-
-        if not media_list:
-
-            try:
-                media_list = self.client.hashtag_medias_top_v1(hashtag, amount=n_media_items)
-            except Exception as e:
-                logger.error(f"Error fetching reels for hashtag {hashtag}: {e}. Retrying...")
-                # try again
-                sleep(1)
-                try:
-                    media_list = self.client.hashtag_medias_top_v1(hashtag, amount=n_media_items)
-                except Exception as e:
-                    logger.error(f"Error fetching reels for hashtag {hashtag}: {e}")
-                    return {"status": 500, "message": "Internal server error"}
-
-            if not media_list:
-                return {"status": 404, "message": "Hashtag not found"}
-
-            # Save retrieved reels in cache folder
-            os.makedirs(f"cache/hashtag/{hashtag}", exist_ok=True)
-            with open(f"cache/hashtag/{hashtag}/reels.json", "w", encoding="utf-8") as f:
-                json.dump(media_list, f, ensure_ascii=False)
-
-        reels = []
-        for media in media_list:
-            if media["media_type"] in {2, 8} and media["play_count"] != 0:
-                if media["play_count"] != 0:
-                    er = (media["like_count"] + media["comment_count"]) / media["play_count"]
-                else:
-                    er = 0
-                reel_item = {
-                    "pk": media["pk"],
-                    "title": media["title"],
-                    "caption_text": media["caption_text"],
-                    "likes": media["like_count"],
-                    "comments": media["comment_count"],
-                    "post_date": media["taken_at"],
-                    "link": f"https://www.instagram.com/reel/{media['code']}/",
-                    "video_url": media["video_url"],
-                    "play_count": media["play_count"],
-                    "id": media["id"],
-                    "er": er,
-                    "owner": media["user"]["username"]
-                }
-                reels.append(reel_item)
+    def fetch_hashtag_reels(self, hashtag: str, n_media_items: int = 50, stale_ok: bool = True):
+        if self.use_cache and self.cache.get_negative("hashtag_negative", hashtag) == NOT_FOUND:
+            return {"status": 404, "message": "Hashtag not found"}
+
+        def load():
+            return self.single_flight.do(
+                ("hashtag_top", hashtag, n_media_items),
+                lambda: self._call_api(
+                    "hashtag_top",
+                    self.client.hashtag_medias_top_v1,
+                    hashtag,
+                    amount=self._fetch_amount("hashtag_top", hashtag, n_media_items),
+                ),
+            )
+
+        try:
+            reels = self._get_reels("hashtag_top", hashtag, load, normalize_media, stale_ok, n_media_items)
+        except BudgetExceededError:
+            return {"status": 503, "message": "API budget exhausted"}
+        except Exception as e:
+            logger.error(f"Error fetching reels for hashtag {hashtag}: {e}")
+            return {"status": 500, "message": "Internal server error"}
+
+        if reels is None:
+            self._remember_negative("hashtag_negative", hashtag, NOT_FOUND)
+            return {"status": 404, "message": "Hashtag not found"}
+
         logger.info(f"Found {len(reels)} reels for hashtag {hashtag}")
-        return {"status": 200, "data": reels}
\ No newline at end of file
+        return {"status": 200, "data": reels}
+
+
+_wrappers: dict[str, InstagramWrapper] = {}
+_wrappers_lock = threading.Lock()
+
+
+def get_instagram_wrapper(token: str) -> InstagramWrapper:
+    """Return the process-wide wrapper for a token so handlers and scheduler share its caches"""
+    with _wrappers_lock:
+        if token not in _wrappers:
+            _wrappers[token] = InstagramWrapper(token)
+        return _wrappers[token]
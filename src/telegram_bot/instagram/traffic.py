@@ -0,0 +1,144 @@
+"""Record and replay of HikerAPI traffic.
+
+``TrafficRecorder`` wraps the wrapper's API client and HTTP session and appends
+every call with its result and timing to a gzip JSON lines archive.
+``TrafficReplayer`` serves an archive back in recorded order per call, either
+instantly or at the recorded latencies divided by ``speed``.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def call_key(target: str, method: str, args: tuple, kwargs: dict) -> str:
+    return json.dumps([target, method, list(args), kwargs], sort_keys=True, ensure_ascii=False)
+
+
+def encode_result(result: Any) -> dict:
+    if isinstance(result, httpx.Response):
+        return {"response": {"status": result.status_code, "body": result.text}}
+    return {"result": result}
+
+
+def encode_error(error: Exception) -> dict:
+    if isinstance(error, httpx.HTTPStatusError):
+        return {"error": {"status": error.response.status_code, "message": str(error)}}
+    return {"error": {"type": type(error).__name__, "message": str(error)}}
+
+
+def decode_record(record: dict) -> Any:
+    """Return the recorded result or raise the recorded error"""
+    if "result" in record:
+        return record["result"]
+    if "response" in record:
+        response = record["response"]
+        return httpx.Response(
+            response["status"],
+            text=response["body"],
+            headers={"content-type": "application/json"},
+            request=httpx.Request("GET", "http://replay"),
+        )
+    error = record["error"]
+    if "status" in error:
+        request = httpx.Request("GET", "http://replay")
+        raise httpx.HTTPStatusError(
+            error["message"], request=request, response=httpx.Response(error["status"], request=request)
+        )
+    if error["type"] in {"TimeoutError", "ReadTimeout", "ConnectTimeout"}:
+        raise TimeoutError(error["message"])
+    raise ConnectionError(f"{error['type']}: {error['message']}")
+
+
+class TrafficRecorder:
+    """Append calls made through ``proxy(target, name)`` objects to a gzip JSON lines archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _write(self, record: dict) -> None:
+        # Non-JSON answers of the real client are raw bytes, keep them as text
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def call(self, name: str, fn: Any, method: str, *args, **kwargs) -> Any:
+        record = {"target": name, "method": method, "args": list(args), "kwargs": kwargs, "started_at": time.time()}
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            record.update(encode_error(e), elapsed=time.monotonic() - start)
+            self._write(record)
+            raise
+        record.update(encode_result(result), elapsed=time.monotonic() - start)
+        self._write(record)
+        return result
+
+    def proxy(self, target: Any, name: str) -> "TrafficProxy":
+        return TrafficProxy(target, name, self)
+
+
+class TrafficReplayer:
+    """Serve recorded calls back, each call key in the order it was recorded
+
+    Args:
+        path: Archive written by ``TrafficRecorder``
+        speed: Recorded latencies are divided by it, None answers without waiting
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None):
+        self.speed = speed
+        self._records = defaultdict(deque)
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                key = call_key(record["target"], record["method"], record["args"], record["kwargs"])
+                self._records[key].append(record)
+
+    def call(self, name: str, fn: Any, method: str, *args, **kwargs) -> Any:
+        key = call_key(name, method, args, kwargs)
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                raise LookupError(f"No recorded traffic for {name}.{method}{tuple(args)}")
+            # The last answer of a key keeps being served once its recordings are used up
+            record = records.popleft() if len(records) > 1 else records[0]
+        if self.speed:
+            time.sleep(record["elapsed"] / self.speed)
+        return decode_record(record)
+
+    def proxy(self, target: Any, name: str) -> "TrafficProxy":
+        return TrafficProxy(target, name, self)
+
+
+class TrafficProxy:
+    """Route method calls of ``target`` through a recorder or replayer"""
+
+    def __init__(self, target: Any, name: str, handler: "TrafficRecorder | TrafficReplayer"):
+        self._target = target
+        self._name = name
+        self._handler = handler
+
+    def __getattr__(self, method: str) -> Any:
+        fn = getattr(self._target, method)
+        if not callable(fn):
+            return fn
+
+        def call(*args, **kwargs):
+            return self._handler.call(self._name, fn, method, *args, **kwargs)
+
+        return call
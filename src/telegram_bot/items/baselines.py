@@ -0,0 +1,95 @@
+"""Streaming estimators of per-account reel baselines.
+
+Each new reel snapshot updates the baseline of its account in constant time and
+memory: an exponential moving average of views per hour and P² quantile
+sketches of views and engagement rates. The sketch states are stored as JSON
+next to the estimates, so no history has to be rescanned.
+"""
+
+from bisect import insort
+from typing import Optional
+
+# Quantiles tracked for every account, sketch name -> quantile
+BASELINE_QUANTILES = {
+    "views_median": 0.5,
+    "engagement_median": 0.5,
+    "engagement_p90": 0.9,
+}
+
+
+def ema(previous: Optional[float], value: float, alpha: float) -> float:
+    """Exponential moving average, the first value starts it"""
+    if previous is None:
+        return value
+    return previous + alpha * (value - previous)
+
+
+class P2Quantile:
+    """Estimate of one quantile of a stream in five markers, the P² algorithm of Jain and Chlamtac
+
+    Args:
+        p: Quantile to estimate, between 0 and 1
+        state: State of ``to_dict``, a fresh sketch when None
+    """
+
+    def __init__(self, p: float, state: Optional[dict] = None):
+        self.p = p
+        state = state or {}
+        self.heights = list(state.get("heights", []))
+        self.positions = list(state.get("positions", [1, 2, 3, 4, 5]))
+        self.desired = list(state.get("desired", [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]))
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def to_dict(self) -> dict:
+        return {"heights": self.heights, "positions": self.positions, "desired": self.desired}
+
+    @property
+    def count(self) -> int:
+        return len(self.heights) if len(self.heights) < 5 else self.positions[4]
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            # Exact quantile of the few values seen so far
+            return self.heights[round(self.p * (len(self.heights) - 1))]
+        return self.heights[2]
+
+    def add(self, x: float) -> None:
+        q, n = self.heights, self.positions
+        if len(q) < 5:
+            insort(q, x)
+            return
+
+        # Cell of the new value, extreme markers follow the minimum and maximum
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
@@ -1,4 +1,5 @@
 import logging
+import os
 from pathlib import Path
 from typing import Any, Dict
 
@@ -6,6 +7,8 @@ from omegaconf import OmegaConf
 from telebot import TeleBot, types
 from telebot.states import State, StatesGroup
 
+from ..instagram.budget import spending_user
+from ..instagram.service import get_instagram_wrapper
 from ..instagram.utils import sanitize_instagram_input
 from ..menu.markup import create_menu_markup
 from .markup import (
@@ -20,6 +23,7 @@ from .service import (
     delete_instagram_account,
     read_instagram_account,
     read_instagram_accounts,
+    update_instagram_account_profile,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,6 +34,9 @@ CURRENT_DIR = Path(__file__).parent
 config = OmegaConf.load(CURRENT_DIR / "config.yaml")
 strings = config.strings
 
+HIKERAPI_TOKEN = os.getenv("HIKERAPI_TOKEN")
+instagram_client = get_instagram_wrapper(HIKERAPI_TOKEN) if HIKERAPI_TOKEN else None
+
 
 class InstagramAccountState(StatesGroup):
     """States for Instagram account-related operations in the bot conversation flow."""
@@ -265,6 +272,13 @@ def register_handlers(bot: TeleBot) -> None:
             )
             added_accounts.append(account)
 
+            # Resolve the profile now so trend runs can fetch clips by pk right away
+            if instagram_client:
+                with spending_user(user.id):
+                    response = instagram_client.get_user_info(username)
+                if response["status"] == 200:
+                    update_instagram_account_profile(db_session, account, response["data"])
+
         # Confirm account addition
         if added_accounts:
             usernames_str = ", ".join(f"@{acc.username}" for acc in added_accounts)
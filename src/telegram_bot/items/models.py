@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, ForeignKey, Float, Index, Integer, String, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from ..models import Base, TimeStampMixin
@@ -16,10 +16,26 @@ class InstagramAccount(Base, TimeStampMixin):
     owner = relationship("User", back_populates="instagram_accounts")
     is_verified = Column(Boolean, default=False)
     reels = relationship("InstagramReels", back_populates="account")
-    
+
+    # Resolved Instagram profile, saves a user info request per trend run
+    pk = Column(String, nullable=True)
+    is_private = Column(Boolean, nullable=True)
+    follower_count = Column(Integer, nullable=True)
+    # UTC time the profile was resolved
+    profile_refreshed_at = Column(DateTime, nullable=True)
+
+    def user_info(self) -> dict:
+        """Return the stored profile in the shape of a HikerAPI user object"""
+        return {
+            "username": self.username,
+            "pk": self.pk,
+            "is_private": self.is_private,
+            "follower_count": self.follower_count or 0,
+        }
+
 
 class InstagramReels(Base, TimeStampMixin):
-    """Instagram Reels model"""
+    """Metric snapshot of an Instagram reel, one row per reel and fetch"""
 
     __tablename__ = "instagram_reels"
 
@@ -31,9 +47,37 @@ class InstagramReels(Base, TimeStampMixin):
     views = Column(Integer, default=0)
     likes = Column(Integer, default=0)
     comments = Column(Integer, default=0)
+    # UTC time the metrics were fetched from the API
+    captured_at = Column(DateTime, nullable=True)
+    # UTC time the reel was posted, snapshots of reels past the trend window are dropped
+    posted_at = Column(DateTime, nullable=True)
 
     account = relationship("InstagramAccount", back_populates="reels")
 
+    # Range queries by reel and time for velocities, by time alone for compaction
+    __table_args__ = (
+        Index("ix_instagram_reels_reel_captured", "reel_id", "captured_at"),
+        Index("ix_instagram_reels_captured", "captured_at"),
+        Index("ix_instagram_reels_posted", "posted_at"),
+    )
+
+
+class InstagramAccountBaseline(Base, TimeStampMixin):
+    """Usual reel metrics of an Instagram account, updated with each new snapshot"""
+
+    __tablename__ = "instagram_account_baselines"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String, nullable=False, unique=True)
+    snapshots = Column(Integer, default=0)
+    # Exponential moving average of the views per hour between snapshots of a reel
+    views_per_hour = Column(Float, nullable=True)
+    views_median = Column(Float, nullable=True)
+    engagement_median = Column(Float, nullable=True)
+    engagement_p90 = Column(Float, nullable=True)
+    # States of the quantile sketches behind the estimates, by estimate name
+    sketches = Column(JSON, nullable=True)
+
 
 class SentReel(Base, TimeStampMixin):
     """Track reels sent to users to avoid duplicates"""
@@ -49,4 +93,4 @@ class SentReel(Base, TimeStampMixin):
     user = relationship("User", back_populates="sent_reels")
 
     # Ensure uniqueness of user_id + reel_url combination
-    __table_args__ = (UniqueConstraint('user_id', 'reel_url', name='unique_user_reel'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('user_id', 'reel_url', name='unique_user_reel'),)
@@ -1,12 +1,18 @@
 import logging
-import random
+import math
+import time
 from datetime import datetime, timedelta, timezone
+from itertools import groupby
 
+import numpy as np
+from sqlalchemy import and_, func, insert, or_, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from ..auth.models import User
-from .models import InstagramAccount, SentReel
+from .baselines import BASELINE_QUANTILES, P2Quantile, ema
+from .models import InstagramAccount, InstagramAccountBaseline, InstagramReels, SentReel
+from .trends import TREND_CATEGORIES, TREND_WINDOW_DAYS, score_reels
 
 
 # Set up logging
@@ -16,6 +22,11 @@ logging.basicConfig(
 )
 
 
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, the convention of profile and snapshot timestamps"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 def create_instagram_account(
     db_session: Session, username: str, owner_id: int
 ):
@@ -68,6 +79,25 @@ def update_instagram_account(
     return account
 
 
+def update_instagram_account_profile(
+    db_session: Session, account: InstagramAccount, user_info: dict
+):
+    """Store the resolved Instagram profile of an account"""
+    account.pk = str(user_info["pk"])
+    account.is_private = user_info.get("is_private", False)
+    account.follower_count = user_info.get("follower_count", 0)
+    account.profile_refreshed_at = utc_now()
+    db_session.commit()
+    return account
+
+
+def profile_needs_refresh(account: InstagramAccount, max_age: timedelta) -> bool:
+    """Check whether the stored profile of an account is missing or older than max_age"""
+    if not account.pk or not account.profile_refreshed_at:
+        return True
+    return utc_now() - account.profile_refreshed_at > max_age
+
+
 def delete_instagram_account(db_session: Session, account_id: int) -> bool:
     """Delete an Instagram account"""
     account = db_session.query(InstagramAccount).filter(InstagramAccount.id == account_id).first()
@@ -87,6 +117,201 @@ def get_all_instagram_accounts_with_owners(db_session: Session):
     )
 
 
+def record_reel_snapshots(
+    db_session: Session, account: InstagramAccount, reels: list, velocity_alpha: float = 0.2
+) -> int:
+    """Store the views, likes and comments of reels as metric snapshots in one bulk insert
+
+    Reels already recorded at or after their fetch time, e.g. served again from
+    the cache, are skipped. The baseline of the account is updated with the new
+    snapshots. Returns the number of snapshots written.
+    """
+    if not reels:
+        return 0
+
+    # Newest snapshot of each reel, the velocity of a new snapshot is measured from it
+    newest = (
+        select(InstagramReels.reel_id, func.max(InstagramReels.captured_at).label("captured_at"))
+        .where(InstagramReels.reel_id.in_({str(reel.pk) for reel in reels}))
+        .group_by(InstagramReels.reel_id)
+        .subquery()
+    )
+    latest = {
+        snapshot.reel_id: (snapshot.captured_at, snapshot.views)
+        for snapshot in db_session.query(InstagramReels.reel_id, InstagramReels.captured_at, InstagramReels.views)
+        .join(newest, and_(InstagramReels.reel_id == newest.c.reel_id, InstagramReels.captured_at == newest.c.captured_at))
+        .all()
+    }
+    now = datetime.now()
+    rows, velocities, new_reel_ids = [], [], set()
+    for reel in reels:
+        reel_id = str(reel.pk)
+        captured_at = datetime.fromtimestamp(reel.fetched_at or time.time(), timezone.utc).replace(tzinfo=None)
+        if reel_id not in latest:
+            new_reel_ids.add(reel_id)
+        else:
+            previous_at, previous_views = latest[reel_id]
+            if previous_at >= captured_at:
+                continue
+            hours = (captured_at - previous_at).total_seconds() / 3600
+            velocities.append(max(reel.play_count - (previous_views or 0), 0) / hours)
+        latest[reel_id] = (captured_at, reel.play_count)
+        rows.append({
+            "account_id": account.id,
+            "reel_id": reel_id,
+            "url": reel.link,
+            "caption": reel.caption_text,
+            "views": reel.play_count,
+            "likes": reel.likes,
+            "comments": reel.comments,
+            "captured_at": captured_at,
+            "posted_at": reel.post_date.replace(tzinfo=None) if reel.post_date else None,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    if rows:
+        db_session.execute(insert(InstagramReels), rows)
+        update_account_baseline(db_session, account.username, rows, velocities, velocity_alpha, new_reel_ids)
+        db_session.commit()
+    return len(rows)
+
+
+def update_account_baseline(
+    db_session: Session,
+    username: str,
+    snapshots: list,
+    velocities: list,
+    velocity_alpha: float,
+    new_reel_ids: set,
+) -> InstagramAccountBaseline:
+    """Fold new snapshots and their views per hour into the baseline of an account
+
+    Views enter the median once per reel, with the first snapshot of each reel in
+    ``new_reel_ids``, so often fetched reels do not outweigh the others.
+    Each value costs a constant amount of work, the history is not read.
+    The caller commits.
+    """
+    baseline = db_session.query(InstagramAccountBaseline).filter(InstagramAccountBaseline.username == username).first()
+    if baseline is None:
+        baseline = InstagramAccountBaseline(username=username, snapshots=0)
+        db_session.add(baseline)
+
+    states = baseline.sketches or {}
+    sketches = {name: P2Quantile(p, states.get(name)) for name, p in BASELINE_QUANTILES.items()}
+    for snapshot in snapshots:
+        views = snapshot["views"] or 0
+        if snapshot["reel_id"] in new_reel_ids:
+            sketches["views_median"].add(views)
+        if views > 0:
+            engagement = ((snapshot["likes"] or 0) + (snapshot["comments"] or 0)) / views
+            sketches["engagement_median"].add(engagement)
+            sketches["engagement_p90"].add(engagement)
+    for velocity in velocities:
+        baseline.views_per_hour = ema(baseline.views_per_hour, velocity, velocity_alpha)
+
+    baseline.snapshots = (baseline.snapshots or 0) + len(snapshots)
+    baseline.views_median = sketches["views_median"].value
+    baseline.engagement_median = sketches["engagement_median"].value
+    baseline.engagement_p90 = sketches["engagement_p90"].value
+    # A new dict, so the JSON column is seen as changed
+    baseline.sketches = {name: sketch.to_dict() for name, sketch in sketches.items()}
+    return baseline
+
+
+def read_account_baselines(db_session: Session, usernames: list) -> dict:
+    """Get the baselines of accounts by username, accounts without snapshots are left out"""
+    if not usernames:
+        return {}
+    return {
+        baseline.username: baseline
+        for baseline in db_session.query(InstagramAccountBaseline)
+        .filter(InstagramAccountBaseline.username.in_(set(usernames)))
+        .all()
+    }
+
+
+def get_view_velocities(db_session: Session, reel_ids: list, window: timedelta) -> dict:
+    """Views per hour of reels between their oldest and newest snapshot within the window
+
+    Reels with less than two snapshots in the window are left out.
+    """
+    if not reel_ids:
+        return {}
+
+    since = utc_now() - window
+    snapshots = (
+        db_session.query(InstagramReels.reel_id, InstagramReels.captured_at, InstagramReels.views)
+        .filter(InstagramReels.reel_id.in_({str(reel_id) for reel_id in reel_ids}))
+        .filter(InstagramReels.captured_at >= since)
+        .order_by(InstagramReels.reel_id, InstagramReels.captured_at)
+        .all()
+    )
+
+    velocities = {}
+    for reel_id, group in groupby(snapshots, key=lambda snapshot: snapshot.reel_id):
+        reel_snapshots = list(group)
+        first, last = reel_snapshots[0], reel_snapshots[-1]
+        hours = (last.captured_at - first.captured_at).total_seconds() / 3600
+        if hours > 0:
+            velocities[reel_id] = max((last.views or 0) - (first.views or 0), 0) / hours
+    return velocities
+
+
+def compact_reel_snapshots(
+    db_session: Session, full_resolution_days: int = 3, hourly_days: int = 7, chunk_size: int = 500
+) -> dict:
+    """Downsample old reel metric snapshots and drop those of reels past the trend window
+
+    Snapshots younger than ``full_resolution_days`` are kept as they are. Older
+    ones are rolled up to the last snapshot of each hour, and past
+    ``hourly_days`` to the last one of each day. The metrics are running totals,
+    so the last snapshot of a bucket keeps the velocities between buckets exact.
+
+    Returns:
+        Number of snapshots ``dropped`` with their reel and ``rolled_up``
+    """
+    now = utc_now()
+    window_start = now - timedelta(days=TREND_WINDOW_DAYS + 1)
+    hourly_start = now - timedelta(days=hourly_days)
+    full_resolution_start = now - timedelta(days=full_resolution_days)
+
+    # Reels without a post time are aged by their snapshots
+    dropped = db_session.query(InstagramReels).filter(
+        or_(
+            InstagramReels.posted_at < window_start,
+            and_(InstagramReels.posted_at.is_(None), InstagramReels.captured_at < window_start),
+        )
+    ).delete(synchronize_session=False)
+
+    snapshots = (
+        db_session.query(InstagramReels.id, InstagramReels.reel_id, InstagramReels.captured_at)
+        .filter(InstagramReels.captured_at < full_resolution_start)
+        .order_by(InstagramReels.reel_id, InstagramReels.captured_at.desc())
+        .all()
+    )
+    kept, superseded = set(), []
+    for snapshot in snapshots:
+        if snapshot.captured_at >= hourly_start:
+            bucket = snapshot.captured_at.replace(minute=0, second=0, microsecond=0)
+        else:
+            bucket = snapshot.captured_at.date()
+        # Newest first, so the first snapshot of a bucket is its last one
+        if (snapshot.reel_id, bucket) in kept:
+            superseded.append(snapshot.id)
+        else:
+            kept.add((snapshot.reel_id, bucket))
+
+    for start in range(0, len(superseded), chunk_size):
+        db_session.query(InstagramReels).filter(
+            InstagramReels.id.in_(superseded[start:start + chunk_size])
+        ).delete(synchronize_session=False)
+    db_session.commit()
+
+    logger.info(f"Compacted reel snapshots: dropped {dropped}, rolled up {len(superseded)}")
+    return {"dropped": dropped, "rolled_up": len(superseded)}
+
+
 def calculate_trend_category(views: int, likes: int, comments: int, 
                            follower_count: int, shares_saves: int = 0, 
                            post_date: datetime = None, avg_tempo: float = 1.0) -> str:
@@ -145,13 +370,13 @@ def calculate_trend_category(views: int, likes: int, comments: int,
 
 
 def build_reason_string(views: int, likes: int, follower_count: int, 
-                       post_date: datetime = None) -> str:
+                       post_date: datetime = None, tempo: float = None) -> str:
     """Build reason string based on conditions"""
     reasons = []
     
-    # Always add tempo reason with random multiplier
-    x = random.randint(2, 4)
-    reasons.append(f"Темп просмотров в {x} раза выше обычного")
+    # Measured tempo against the account's usual one
+    if tempo is not None and tempo > 1:
+        reasons.append(f"Темп просмотров в {tempo:.1f} раза выше обычного")
     
     # Views vs followers
     if views > follower_count:
@@ -183,78 +408,77 @@ def build_reason_string(views: int, likes: int, follower_count: int,
 
 def analyze_account_trends(reels: list, user_info: dict) -> list:
     """Analyze reels to identify trending content"""
-    trending_content = []
     logger.info(f"Analyzing {len(reels)} reels of {user_info.get('username', 'unknown')} for trends")
-    if not reels:
+    return analyze_accounts_trends([(reels, user_info)])[0]
+
+
+def analyze_accounts_trends(accounts: list, velocities: dict = None, baselines: dict = None) -> list:
+    """Identify trending reels of many accounts, scored together in one vectorized pass
+
+    Args:
+        accounts: (reels, user_info) pairs
+        velocities: Views per hour by reel id, see ``get_view_velocities``
+        baselines: Account baselines by username, see ``read_account_baselines``.
+            A reel's tempo is its velocity over the account's usual views per
+            hour, else its views over the account's median views, else its
+            views per follower
+
+    Returns:
+        The trending items of each account, in the order of ``accounts``,
+        each list sorted by engagement rate
+    """
+    rows = []
+    for account_index, (reels, user_info) in enumerate(accounts):
+        follower_count = user_info.get('follower_count', 0)
+        rows.extend((account_index, reel, follower_count) for reel in reels)
+
+    trending_content = [[] for _ in accounts]
+    if not rows:
         return trending_content
 
-    follower_count = user_info.get('follower_count', 0)
+    velocities = velocities or {}
+    account_baselines = [(baselines or {}).get(user_info.get('username')) for _, user_info in accounts]
+
+    def baseline_column(name: str) -> np.ndarray:
+        values = [getattr(baseline, name, None) for baseline in account_baselines]
+        by_account = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        return by_account[[account_index for account_index, _, _ in rows]]
+
+    scores = score_reels(
+        views=np.array([reel.play_count for _, reel, _ in rows]),
+        likes=np.array([reel.likes for _, reel, _ in rows]),
+        comments=np.array([reel.comments for _, reel, _ in rows]),
+        followers=np.array([follower_count for _, _, follower_count in rows]),
+        posted_at=np.array([np.nan if reel.posted_at is None else reel.posted_at for _, reel, _ in rows]),
+        invalid_posted_at=np.array([reel.posted_at is not None and math.isnan(reel.posted_at) for _, reel, _ in rows]),
+        now=time.time(),
+        velocity=np.array([velocities.get(str(reel.pk), np.nan) for _, reel, _ in rows], dtype=np.float64),
+        baseline_velocity=baseline_column('views_per_hour'),
+        baseline_views=baseline_column('views_median'),
+        baseline_engagement=baseline_column('engagement_median'),
+    )
 
-    for reel in reels:
-        # Check if content is trending based on various criteria
-        views = reel.get('play_count', 0)
-        likes = reel.get('likes', 0)
-        comments = reel.get('comments', 0)
-
-        # Skip if no views
-        if views == 0:
-            continue
-
-        # Calculate engagement rate
-        engagement_rate = (likes + comments) / views if views > 0 else 0
-
-        # Criteria for trending:
-        # 1. Views are 3x higher than average (using follower count as baseline)
-        # 2. Views exceed follower count
-        # 3. High engagement rate (> 0.05)
-        
-        is_trending = False
-        
-        # Posted last 14 days
-        if reel.get('post_date'):
-            try:
-                post_date = datetime.fromisoformat(reel['post_date'].replace('Z', '+00:00'))
-                if (datetime.now(timezone.utc) - post_date).days > 14:
-                    continue
-            except ValueError:
-                logger.warning(f"Invalid post date format for reel {reel['link']}")
-                continue
-        
-        # High engagement rate
-        if engagement_rate > 0.05:
-            is_trending = True
-            
-        # Views exceed follower count
-        if views > follower_count:
-            is_trending = True
-
-        if is_trending:
-            logger.info(f"Found trending reel: {reel['link']} with views: {views}, likes: {likes}, comments: {comments}")
-            post_date = reel.get('post_date')
-            if isinstance(post_date, str):
-                try:
-                    post_date = datetime.fromisoformat(post_date.replace('Z', '+00:00'))
-                except:
-                    post_date = None
-            
-            trending_item = {
-                'account_name': reel['owner'],
-                'video_url': reel['link'],
-                'reason': build_reason_string(views, likes, follower_count, post_date),
-                'views': views,
-                'likes': likes,
-                'comments': comments,
-                'followers': follower_count,
-                'engagement_rate': engagement_rate,
-                'trend_category': calculate_trend_category(
-                    views, likes, comments, follower_count, 0, post_date
-                ),
-                'post_date': reel['post_date']
-            }
-            trending_content.append(trending_item)
-
-    # Sort by engagement rate and return top items
-    trending_content.sort(key=lambda x: x['engagement_rate'], reverse=True)
+    for row in np.flatnonzero(scores['trending']):
+        account_index, reel, follower_count = rows[row]
+        views, likes, comments = reel.play_count, reel.likes, reel.comments
+        tempo = float(scores['tempo_ratio'][row]) if scores['tempo_known'][row] else None
+        logger.info(f"Found trending reel: {reel.link} with views: {views}, likes: {likes}, comments: {comments}")
+        trending_content[account_index].append({
+            'account_name': reel.owner,
+            'video_url': reel.link,
+            'reason': build_reason_string(views, likes, follower_count, reel.post_date, tempo),
+            'views': views,
+            'likes': likes,
+            'comments': comments,
+            'followers': follower_count,
+            'engagement_rate': float(scores['engagement'][row]),
+            'trend_category': TREND_CATEGORIES[scores['category'][row]],
+            'post_date': reel.post_date
+        })
+
+    # Sort by engagement rate
+    for items in trending_content:
+        items.sort(key=lambda x: x['engagement_rate'], reverse=True)
     return trending_content
 
 
@@ -0,0 +1,117 @@
+"""Vectorized trend scoring of reels.
+
+``score_reels`` applies the rules of ``service.calculate_trend_category`` and the
+trending filter of ``service.analyze_account_trends`` to column arrays, so the
+reels of many accounts are scored in one pass. View velocities from metric
+snapshots and the baselines of the accounts, when given, replace the views per
+follower tempo proxy.
+"""
+
+import numpy as np
+
+# Trend categories by rising score, a score reaches a category at its threshold
+TREND_CATEGORIES = ("Низкий", "Средний", "Высокий", "Ультра-тренд")
+CATEGORY_THRESHOLDS = (3, 6, 8)
+
+# Reels older than this many whole days are not analyzed
+TREND_WINDOW_DAYS = 14
+# Reels younger than this many hours score as fresh
+FRESH_HOURS = 24
+
+
+def score_reels(
+    views: np.ndarray,
+    likes: np.ndarray,
+    comments: np.ndarray,
+    followers: np.ndarray,
+    posted_at: np.ndarray,
+    now: float,
+    shares_saves: np.ndarray = None,
+    velocity: np.ndarray = None,
+    baseline_velocity: np.ndarray = None,
+    baseline_views: np.ndarray = None,
+    baseline_engagement: np.ndarray = None,
+    invalid_posted_at: np.ndarray = None,
+) -> dict[str, np.ndarray]:
+    """Score reels given as equally long column arrays
+
+    Args:
+        views, likes, comments: Metrics of each reel
+        followers: Follower count of each reel's account
+        posted_at: Epoch seconds each reel was posted, NaN when unknown
+        now: Epoch seconds the ages are computed against
+        shares_saves: Shares and saves of each reel, zeros when not given
+        velocity: Views per hour of each reel from its snapshots, NaN when unknown
+        baseline_velocity: Usual views per hour of each reel's account, NaN when unknown
+        baseline_views: Median views of each reel's account, NaN when unknown
+        baseline_engagement: Median engagement rate of each reel's account, NaN when unknown
+        invalid_posted_at: Whether each reel's post time failed to parse, such reels are never trending
+
+    Returns:
+        Arrays ``engagement``, ``tempo_ratio``, ``tempo_known``, ``fresh``,
+        ``score``, ``category`` (index into ``TREND_CATEGORIES``) and ``trending``.
+        The tempo ratio is velocity over usual velocity where both are known,
+        else views over median views, else views over followers. Reels whose
+        views did not move are not trending, and an engaging reel must beat its
+        account's median engagement.
+    """
+    views = np.asarray(views, dtype=np.float64)
+    likes = np.asarray(likes, dtype=np.float64)
+    comments = np.asarray(comments, dtype=np.float64)
+    followers = np.asarray(followers, dtype=np.float64)
+    posted_at = np.asarray(posted_at, dtype=np.float64)
+    if invalid_posted_at is None:
+        invalid_posted_at = np.zeros(posted_at.shape, dtype=bool)
+    shares_saves = np.zeros_like(views) if shares_saves is None else np.asarray(shares_saves, dtype=np.float64)
+
+    viewed = views > 0
+    # Unviewed reels divide by one, their rates are masked out below
+    safe_views = np.where(viewed, views, 1.0)
+    engagement = np.where(viewed, (likes + comments) / safe_views, 0.0)
+    tempo_ratio = views / np.maximum(followers, 1.0)
+    tempo_known = np.zeros_like(viewed)
+    stalled = np.zeros_like(viewed)
+    # Fallbacks first, so the measured velocity wins where it is known
+    if baseline_views is not None:
+        baseline_views = np.asarray(baseline_views, dtype=np.float64)
+        usual_views = np.isfinite(baseline_views) & (baseline_views > 0)
+        tempo_ratio = np.where(usual_views, views / np.where(usual_views, baseline_views, 1.0), tempo_ratio)
+        tempo_known = usual_views
+    if velocity is not None:
+        velocity = np.asarray(velocity, dtype=np.float64)
+        baseline_velocity = np.asarray(baseline_velocity, dtype=np.float64)
+        usual_velocity = np.isfinite(velocity) & np.isfinite(baseline_velocity) & (baseline_velocity > 0)
+        tempo_ratio = np.where(usual_velocity, velocity / np.where(usual_velocity, baseline_velocity, 1.0), tempo_ratio)
+        tempo_known = tempo_known | usual_velocity
+        stalled = velocity == 0
+    engagement_threshold = 0.05
+    if baseline_engagement is not None:
+        # fmax ignores the NaNs of accounts without a baseline
+        engagement_threshold = np.fmax(engagement_threshold, np.asarray(baseline_engagement, dtype=np.float64))
+    exceeds_followers = views > followers
+
+    age = now - posted_at
+    with np.errstate(invalid="ignore"):
+        # NaN ages, unknown post dates, are neither fresh nor out of the window
+        fresh = age < FRESH_HOURS * 3600
+        out_of_window = age >= (TREND_WINDOW_DAYS + 1) * 86400
+
+    score = np.select([tempo_ratio > 3, tempo_ratio > 2], [3, 2], 0)
+    score += 2 * exceeds_followers
+    score += viewed & (likes / safe_views > 0.1)
+    score += viewed & (comments / safe_views > 0.01)
+    score += viewed & (shares_saves / safe_views > 0.02)
+    score += fresh
+
+    trending = viewed & ~out_of_window & ~stalled & ~np.asarray(invalid_posted_at, dtype=bool)
+    trending &= (engagement > engagement_threshold) | exceeds_followers
+
+    return {
+        "engagement": engagement,
+        "tempo_ratio": tempo_ratio,
+        "tempo_known": tempo_known,
+        "fresh": fresh,
+        "score": score,
+        "category": np.searchsorted(CATEGORY_THRESHOLDS, score, side="right"),
+        "trending": trending,
+    }
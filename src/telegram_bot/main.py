@@ -10,7 +10,7 @@ from telebot.states.sync.middleware import StateMiddleware
 from .admin.handlers import register_handlers as admin_handlers
 from .auth.data import init_roles_table, init_superuser
 from .common.handlers import register_handlers as common_handlers
-from .database.core import SessionLocal, create_tables
+from .database.core import SessionLocal, create_tables, upgrade_tables
 from .help.handlers import register_handlers as help_handlers
 
 #from .google_sheets.handlers import register_handlers as google_sheets_handlers
@@ -129,6 +129,7 @@ def init_db():
 if __name__ == "__main__":
     #drop_tables()
     #init_db()
+    upgrade_tables()
     init_scheduler()
     logger.info("Starting Telegram bot...")
     start_bot()
@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime, timedelta
 from dotenv import load_dotenv, find_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
@@ -43,7 +44,15 @@ job_defaults = {
 
 scheduler = BackgroundScheduler(jobstores=jobstores, job_defaults=job_defaults)
 
-from .tasks import send_trend_notifications, check_balance
+from .tasks import (
+    send_trend_notifications,
+    check_balance,
+    compact_snapshots,
+    maintain_instagram_cache,
+    prewarm_instagram_cache,
+    config,
+    instagram_config,
+)
 
 # scheduler.add_job(remove_past_scheduled_games, 'cron', hour=0)  # Runs daily at midnight
 
@@ -53,15 +62,31 @@ def init_scheduler():
         scheduler.start()
         logger.info("Scheduler started")
 
-        # Schedule trend notifications - runs every 270 minutes
-        scheduler.add_job(
+        # Schedule trend notifications
+        trend_interval = config.app.trend_interval_minutes
+        trend_job = scheduler.add_job(
             send_trend_notifications,
             'interval',
-            minutes=200,
+            minutes=trend_interval,
             id='trend_notifications',
             replace_existing=True
         )
-        logger.info("Trend notifications scheduled to run every 200 minutes")
+        logger.info(f"Trend notifications scheduled to run every {trend_interval} minutes")
+
+        # Schedule the cache warm-up - same interval, lead_minutes ahead of each trend run
+        prewarm = config.app.prewarm
+        if prewarm.enabled:
+            first_trend_run = trend_job.next_run_time or datetime.now().astimezone() + timedelta(minutes=trend_interval)
+            first_prewarm_run = first_trend_run - timedelta(minutes=prewarm.lead_minutes % trend_interval)
+            scheduler.add_job(
+                prewarm_instagram_cache,
+                'interval',
+                minutes=trend_interval,
+                next_run_time=first_prewarm_run,
+                id='instagram_cache_prewarm',
+                replace_existing=True
+            )
+            logger.info(f"Instagram cache warm-up scheduled {prewarm.lead_minutes} minutes before trend notifications")
 
         # Schedule balance check - runs every 4 minutes
         scheduler.add_job(
@@ -72,3 +97,27 @@ def init_scheduler():
             replace_existing=True
         )
         logger.info("Balance check scheduled to run every 4 minutes")
+
+        # Schedule cache maintenance - keeps the Instagram cache within its disk budget
+        scheduler.add_job(
+            maintain_instagram_cache,
+            'interval',
+            minutes=instagram_config.cache.eviction.interval_minutes,
+            id='instagram_cache_maintenance',
+            replace_existing=True
+        )
+        logger.info(
+            f"Instagram cache maintenance scheduled to run every "
+            f"{instagram_config.cache.eviction.interval_minutes} minutes"
+        )
+
+        # Schedule snapshot compaction - rolls up old reel metric snapshots
+        compaction_interval = config.app.snapshots.compaction_interval_minutes
+        scheduler.add_job(
+            compact_snapshots,
+            'interval',
+            minutes=compaction_interval,
+            id='reel_snapshot_compaction',
+            replace_existing=True
+        )
+        logger.info(f"Reel snapshot compaction scheduled to run every {compaction_interval} minutes")
@@ -1,5 +1,8 @@
 import logging
 import os
+import time
+from collections import Counter
+from datetime import timedelta
 from pathlib import Path
 from typing import Any, Dict, List
 
@@ -8,13 +11,22 @@ from telebot import TeleBot
 
 from ..auth.service import get_admin_users
 from ..database.core import get_db
-from ..instagram.service import InstagramWrapper
+from ..instagram.budget import spending_user
+from ..instagram.concurrency import background_priority
+from ..instagram.service import config as instagram_config
+from ..instagram.service import get_instagram_wrapper
 from ..items.service import (
-    analyze_account_trends,
+    analyze_accounts_trends,
     cleanup_old_sent_reels,
+    compact_reel_snapshots,
     filter_unsent_reels,
     get_all_instagram_accounts_with_owners,
+    get_view_velocities,
+    profile_needs_refresh,
+    read_account_baselines,
+    record_reel_snapshots,
     record_sent_reel,
+    update_instagram_account_profile,
 )
 
 logger = logging.getLogger(__name__)
@@ -23,6 +35,8 @@ logger = logging.getLogger(__name__)
 CURRENT_DIR = Path(__file__).parent.parent / "items"
 config = OmegaConf.load(CURRENT_DIR / "config.yaml")
 strings = config.strings
+profile_max_age = timedelta(hours=config.app.profile_refresh_hours)
+velocity_window = timedelta(hours=config.app.snapshots.velocity_window_hours)
 
 # Initialize Instagram wrapper
 HIKERAPI_TOKEN = os.getenv("HIKERAPI_TOKEN")
@@ -30,7 +44,7 @@ if not HIKERAPI_TOKEN:
     logger.error("HIKERAPI_TOKEN not found in environment variables")
     instagram_wrapper = None
 else:
-    instagram_wrapper = InstagramWrapper(HIKERAPI_TOKEN)
+    instagram_wrapper = get_instagram_wrapper(HIKERAPI_TOKEN)
 
 # Initialize bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -48,20 +62,34 @@ def send_trend_notifications():
 
     logger.info("Starting trend notifications task")
 
-    try:
-        # Get database session
-        db_session = next(get_db())
+    # Let interactive requests overtake the scheduler's API calls
+    with background_priority():
+        _send_trend_notifications()
+
+    for lane, stats in instagram_wrapper.limiter.stats().items():
+        logger.info(
+            f"HikerAPI {lane} lane: {stats.acquired} requests, "
+            f"average wait {stats.average_wait:.2f}s, max wait {stats.max_wait:.2f}s"
+        )
 
+
+def _send_trend_notifications():
+    """Analyze every tracked account and notify its owner about trending reels"""
+    db_session = next(get_db())
+    try:
         # Clean up old sent reels (older than 30 days)
         cleanup_old_sent_reels(db_session, days_old=30)
 
-        # Get all Instagram accounts with their owners
-        accounts_with_owners = get_all_instagram_accounts_with_owners(db_session)
-        
+        accounts_with_owners = get_tracked_accounts(db_session)
         if not accounts_with_owners:
             logger.info("No Instagram accounts found")
             return
-            
+
+        warmed = instagram_wrapper.warm_user_clips(
+            list({account.username for account, _ in accounts_with_owners})
+        )
+        logger.info(f"Loaded cached reels of {warmed} accounts from disk")
+
         # Group accounts by owner
         user_accounts = {}
         for account, user in accounts_with_owners:
@@ -77,45 +105,149 @@ def send_trend_notifications():
             logger.info(f"Processing notifications for user {user.id} with {len(accounts)} accounts")
             
             trending_content = []
-            
-            # Analyze each account
-            for account in accounts:
-                try:
-                    # Get user info
-                    user_info_result = instagram_wrapper.get_user_info(account.username)
-                    if user_info_result['status'] != 200:
-                        logger.warning(f"Could not fetch user info for {account.username}")
-                        continue
+            analyzed_accounts = []
 
-                    user_info = user_info_result['data']
+            # Fetch each account, API spending is charged to the owner
+            with spending_user(user.id):
+                for account in accounts:
+                    try:
+                        # Skip accounts recently found missing, private or without reels
+                        negative_reason = instagram_wrapper.get_negative_reason(account.username)
+                        if negative_reason:
+                            logger.info(f"Skipping {account.username}: cached as {negative_reason}")
+                            continue
 
-                    # Get reels
-                    reels_result = instagram_wrapper.fetch_user_reels(user_info, n_media_items=10)
-                    if reels_result['status'] != 200:
-                        logger.warning(f"Could not fetch reels for {account.username}")
-                        continue
+                        # Use the stored profile, refresh it on a slow cadence
+                        if profile_needs_refresh(account, profile_max_age):
+                            user_info_result = instagram_wrapper.get_user_info(account.username)
+                            if user_info_result['status'] != 200:
+                                logger.warning(f"Could not fetch user info for {account.username}")
+                                continue
 
-                    reels = reels_result['data']
+                            user_info = user_info_result['data']
+                            update_instagram_account_profile(db_session, account, user_info)
+                        else:
+                            user_info = account.user_info()
 
-                    # Analyze for trending content
-                    trends = analyze_account_trends(reels, user_info)
-                    if trends:
-                        trending_content.extend(trends)
+                        # Get reels, trend analysis must not run on stale clips; the warm-up job
+                        # usually fetched them shortly before
+                        reels_result = instagram_wrapper.fetch_user_reels(user_info, n_media_items=10, stale_ok=False)
+                        if reels_result['status'] != 200:
+                            logger.warning(f"Could not fetch reels for {account.username}")
+                            continue
 
-                except Exception as e:
-                    logger.error(f"Error processing account {account.username}: {e}")
-                    continue
+                        # Snapshot the metrics, reels served again from the cache are skipped
+                        record_reel_snapshots(
+                            db_session, account, reels_result['data'], config.app.baselines.velocity_alpha
+                        )
+                        analyzed_accounts.append((reels_result['data'], user_info))
 
-            # Filter out already sent reels
-            unsent_trending_content = filter_unsent_reels(db_session, user.id, trending_content)
-            # Send notifications if unsent trending content found
-            send_user_notifications(user, unsent_trending_content, db_session)
+                    except Exception as e:
+                        # Drop a half-written snapshot or profile so the next account's commit does not carry it
+                        db_session.rollback()
+                        logger.error(f"Error processing account {account.username}: {e}")
+                        continue
+
+            # A failure for one user must not skip the others
+            try:
+                # Analyze all accounts of the user for trending content in one pass,
+                # with the view velocities measured between snapshots and the accounts' baselines
+                velocities = get_view_velocities(
+                    db_session,
+                    [reel.pk for reels, _ in analyzed_accounts for reel in reels],
+                    velocity_window,
+                )
+                baselines = read_account_baselines(
+                    db_session, [user_info.get('username') for _, user_info in analyzed_accounts]
+                )
+                for trends in analyze_accounts_trends(analyzed_accounts, velocities, baselines):
+                    trending_content.extend(trends)
+
+                # Filter out already sent reels
+                unsent_trending_content = filter_unsent_reels(db_session, user.id, trending_content)
+                # Send notifications if unsent trending content found
+                send_user_notifications(user, unsent_trending_content, db_session)
+            except Exception as e:
+                db_session.rollback()
+                logger.error(f"Error sending trend notifications to user {user.id}: {e}")
 
-        db_session.close()
         logger.info("Trend notifications task completed")
 
     except Exception as e:
         logger.error(f"Error in trend notifications task: {e}")
+    finally:
+        db_session.close()
+
+
+def get_tracked_accounts(db_session) -> list:
+    """All (account, owner) pairs, cut down to the most shared accounts when the budget is low"""
+    accounts_with_owners = get_all_instagram_accounts_with_owners(db_session)
+    if accounts_with_owners and instagram_wrapper.budget.skips_low_priority():
+        accounts_with_owners = select_priority_accounts(
+            accounts_with_owners, instagram_wrapper.budget.trend_account_limit
+        )
+    return accounts_with_owners
+
+
+def prewarm_instagram_cache():
+    """Refresh profiles and reels of tracked accounts ahead of the trend notification run
+
+    Requests are spread evenly over the configured window, so the notification
+    pass mostly reads fresh cache.
+    """
+    if not instagram_wrapper:
+        logger.error("Instagram wrapper not initialized")
+        return
+
+    prewarm = config.app.prewarm
+    db_session = next(get_db())
+    try:
+        # One refresh per account, charged to its first owner
+        owners = {}
+        for account, user in get_tracked_accounts(db_session):
+            owners.setdefault(account.username.lower(), (account, user))
+        if not owners:
+            return
+
+        interval = max(prewarm.window_minutes * 60 / len(owners), prewarm.min_interval_seconds)
+        logger.info(f"Warming up the cache of {len(owners)} accounts, one every {interval:.1f}s")
+        started = time.monotonic()
+        warmed = 0
+        with background_priority():
+            for index, (account, user) in enumerate(owners.values()):
+                # Keep the pace even when requests are slow
+                time.sleep(max(0.0, started + index * interval - time.monotonic()))
+                try:
+                    with spending_user(user.id):
+                        warmed += _prewarm_account(db_session, account)
+                except Exception as e:
+                    logger.error(f"Error warming up account {account.username}: {e}")
+        logger.info(f"Cache warm-up finished: {warmed} of {len(owners)} accounts refreshed")
+    finally:
+        db_session.close()
+
+
+def _prewarm_account(db_session, account) -> bool:
+    if instagram_wrapper.get_negative_reason(account.username):
+        return False
+    if profile_needs_refresh(account, profile_max_age):
+        user_info_result = instagram_wrapper.get_user_info(account.username)
+        if user_info_result['status'] != 200:
+            return False
+        user_info = user_info_result['data']
+        update_instagram_account_profile(db_session, account, user_info)
+    else:
+        user_info = account.user_info()
+    # Same request as the notification pass, which then reads it from cache
+    return instagram_wrapper.fetch_user_reels(user_info, n_media_items=10, stale_ok=False)['status'] == 200
+
+
+def select_priority_accounts(accounts_with_owners: list, limit: int) -> list:
+    """Keep the (account, owner) pairs of the ``limit`` most tracked usernames"""
+    owners_count = Counter(account.username.lower() for account, _ in accounts_with_owners)
+    kept = {username for username, _ in owners_count.most_common(limit)}
+    logger.info(f"Budget is low, analyzing {len(kept)} of {len(owners_count)} tracked accounts")
+    return [(account, user) for account, user in accounts_with_owners if account.username.lower() in kept]
 
 
 def send_user_notifications(user, trending_content: List[Dict[str, Any]], db_session):
@@ -162,11 +294,39 @@ def send_user_notifications(user, trending_content: List[Dict[str, Any]], db_ses
 
 def check_balance():
     # Check balance
-    balance_info = instagram_wrapper.get_balance()
+    with background_priority():
+        balance_info = instagram_wrapper.get_balance()
     logger.info(f"Current HIKER API balance: {balance_info}")
     amount = balance_info['data']['amount']
+    instagram_wrapper.budget.reconcile(amount)
+    logger.info(
+        f"HikerAPI spending since start: {instagram_wrapper.budget.total_spent:.4f}, "
+        f"by call type: {dict(instagram_wrapper.budget.spent_by_kind)}, "
+        f"by user: {dict(instagram_wrapper.budget.spent_by_user)}"
+    )
     if amount < 4:
         # Send notification to all admin users
         db_session = next(get_db())
         for admin in get_admin_users(db_session):
-            bot.send_message(admin.id, f"HIKER API balance is low: {amount}")
\ No newline at end of file
+            bot.send_message(admin.id, f"HIKER API balance is low: {amount}")
+
+def maintain_instagram_cache():
+    """Keep the Instagram disk cache within its configured size budget"""
+    eviction = instagram_config.cache.eviction
+    removed = instagram_wrapper.cache.enforce_disk_budget(
+        eviction.max_bytes, eviction.max_entries, eviction.policy
+    )
+    logger.info(f"Instagram cache maintenance removed {removed} entries")
+
+
+def compact_snapshots():
+    """Downsample the stored reel metric snapshots so history reads stay bounded"""
+    snapshots = config.app.snapshots
+    db_session = next(get_db())
+    try:
+        compact_reel_snapshots(db_session, snapshots.full_resolution_days, snapshots.hourly_days)
+    except Exception as e:
+        db_session.rollback()
+        logger.error(f"Error compacting reel snapshots: {e}")
+    finally:
+        db_session.close()
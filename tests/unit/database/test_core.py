@@ -0,0 +1,57 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from telegram_bot.database import core
+from telegram_bot.items import models  # noqa: F401 - registers the item tables
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    monkeypatch.setattr(core, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_adds_missing_columns_and_indexes_once(engine, caplog):
+    # Tables as created before the profile and snapshot columns existed
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE instagram_accounts (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL, "
+            "owner_id INTEGER, is_verified BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        ))
+        # Also without reel_id, NOT NULL without a default, which existing rows cannot fill
+        connection.execute(text(
+            "CREATE TABLE instagram_reels (id INTEGER PRIMARY KEY, account_id INTEGER, "
+            "url VARCHAR NOT NULL, caption VARCHAR, views INTEGER, likes INTEGER, comments INTEGER, "
+            "created_at DATETIME, updated_at DATETIME)"
+        ))
+        connection.execute(text("INSERT INTO instagram_accounts (id, username) VALUES (1, 'alice')"))
+
+    # Act
+    with caplog.at_level(logging.INFO, logger=core.logger.name):
+        core.upgrade_tables()
+    first_run = [record.getMessage() for record in caplog.records]
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger=core.logger.name):
+        core.upgrade_tables()
+    second_run = [record.getMessage() for record in caplog.records]
+
+    # Assert
+    inspector = inspect(engine)
+    account_columns = {column["name"] for column in inspector.get_columns("instagram_accounts")}
+    assert {"pk", "is_private", "follower_count", "profile_refreshed_at"} <= account_columns
+    reel_columns = {column["name"] for column in inspector.get_columns("instagram_reels")}
+    assert {"captured_at", "posted_at"} <= reel_columns
+    assert "reel_id" not in reel_columns
+    reel_indexes = {index["name"] for index in inspector.get_indexes("instagram_reels")}
+    assert "ix_instagram_reels_captured" in reel_indexes
+    assert "Added column instagram_accounts.follower_count" in first_run
+    assert "Not adding NOT NULL column instagram_reels.reel_id without a server default" in first_run
+    assert "Not creating index ix_instagram_reels_reel_captured on columns missing in instagram_reels" in first_run
+    assert "Created index ix_instagram_reels_captured" in first_run
+    assert not [message for message in second_run if message.startswith(("Added column", "Created index"))]
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT username FROM instagram_accounts")).scalar_one() == "alice"
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import httpx
+
+from telegram_bot.instagram.async_service import AsyncInstagramWrapper
+from telegram_bot.instagram.cache import FileCache, InstagramCache
+from telegram_bot.instagram.resilience import CircuitBreaker, RetryPolicy
+
+USER = {"username": "alice", "pk": "1", "is_private": False}
+MEDIA = {
+    "media_type": 2,
+    "play_count": 100,
+    "like_count": 10,
+    "comment_count": 1,
+    "pk": "10",
+    "id": "10_1",
+    "title": "",
+    "caption_text": "caption",
+    "taken_at": "2026-10-10T00:00:00Z",
+    "code": "abc",
+    "video_url": "https://example.com/video.mp4",
+}
+
+
+def make_wrapper(requests):
+    async def handler(request):
+        requests.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=[MEDIA])
+
+    wrapper = AsyncInstagramWrapper("token")
+    wrapper.use_cache = False
+    wrapper.http = httpx.AsyncClient(base_url="https://api.test", transport=httpx.MockTransport(handler))
+    return wrapper
+
+
+def test_concurrent_fetches_share_one_request():
+    requests = []
+
+    async def run():
+        async with make_wrapper(requests) as wrapper:
+            return await asyncio.gather(*(wrapper.fetch_user_reels(USER, 10) for _ in range(5)))
+
+    # Act
+    responses = asyncio.run(run())
+
+    # Assert
+    assert requests == ["/v1/user/clips"]
+    assert all(response["status"] == 200 for response in responses)
+    assert responses[0]["data"][0].link == "https://www.instagram.com/reel/abc/"
+
+
+def test_balance_is_retried_through_the_policy():
+    answers = [httpx.Response(503, json={"detail": "Unavailable"}), httpx.Response(200, json={"amount": 5.0})]
+
+    async def handler(request):
+        return answers.pop(0)
+
+    async def run():
+        wrapper = AsyncInstagramWrapper("token")
+        wrapper.retry_policy = RetryPolicy(base_delay=0)
+        wrapper.breaker = CircuitBreaker()
+        wrapper.http = httpx.AsyncClient(base_url="https://api.test", transport=httpx.MockTransport(handler))
+        async with wrapper:
+            return await wrapper.get_balance()
+
+    # Act
+    response = asyncio.run(run())
+
+    # Assert
+    assert response == {"status": 200, "data": {"amount": 5.0}}
+    assert answers == []
+
+
+def test_cache_io_runs_off_the_event_loop(tmp_path):
+    cache = InstagramCache(FileCache(str(tmp_path)), ttl={"user_clips": 60}, stale_ttl={"user_clips": 60})
+    backend_threads = []
+    for name in ("get", "set"):
+        method = getattr(cache.backend, name)
+
+        def record(*args, method=method, **kwargs):
+            backend_threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+
+        setattr(cache.backend, name, record)
+
+    async def run():
+        async with make_wrapper([]) as wrapper:
+            wrapper.use_cache = True
+            wrapper.cache = cache
+            response = await wrapper.fetch_user_reels(USER, 10)
+            return response, threading.get_ident()
+
+    # Act
+    response, loop_thread = asyncio.run(run())
+
+    # Assert
+    assert response["status"] == 200
+    assert backend_threads and loop_thread not in backend_threads
+
+
+def test_missing_user_is_not_found_and_remembered(tmp_path):
+    async def handler(request):
+        return httpx.Response(404, json={"detail": "Target user not found", "exc_type": "UserNotFound"})
+
+    async def run():
+        wrapper = AsyncInstagramWrapper("token")
+        wrapper.cache = InstagramCache(
+            FileCache(str(tmp_path)),
+            ttl={"user_info": 60},
+            stale_ttl={"user_info": 0},
+            negative_ttl={"not_found": 60},
+        )
+        wrapper.http = httpx.AsyncClient(base_url="https://api.test", transport=httpx.MockTransport(handler))
+        async with wrapper:
+            return await wrapper.get_user_info("nobody"), await wrapper.get_negative_reason("nobody")
+
+    # Act
+    response, reason = asyncio.run(run())
+
+    # Assert
+    assert response["status"] == 404
+    assert reason == "not_found"
@@ -0,0 +1,104 @@
+import gc
+
+import pytest
+
+from telegram_bot.instagram.budget import (
+    CRITICAL,
+    LOW,
+    NORMAL,
+    BudgetExceededError,
+    BudgetManager,
+    spending_user,
+)
+from telegram_bot.instagram.cache import FileCache, InstagramCache
+from telegram_bot.instagram.concurrency import BACKGROUND, INTERACTIVE
+
+
+class FakeCache:
+    ttl_scale = 1.0
+
+
+def make_budget():
+    return BudgetManager(
+        costs={"user_clips": 1.0, "balance": 0},
+        low_balance=10,
+        saving_balance=6,
+        critical_balance=3,
+        ttl_multiplier=4,
+    )
+
+
+def test_spending_is_tracked_per_user_and_call_type():
+    budget = make_budget()
+
+    # Act
+    with spending_user(42):
+        budget.charge("user_clips")
+    budget.charge("user_clips")
+
+    # Assert
+    assert budget.total_spent == 2.0
+    assert budget.spent_by_kind["user_clips"] == 2.0
+    assert budget.spent_by_user[42] == 1.0
+    assert budget.level == NORMAL
+
+
+def test_low_balance_stretches_cache_ttl():
+    budget = make_budget()
+    cache = FakeCache()
+    budget.attach(cache)
+
+    # Act
+    budget.reconcile(11)
+    budget.charge("user_clips")
+    budget.charge("user_clips")
+
+    # Assert
+    assert budget.level == LOW
+    assert cache.ttl_scale == 4
+
+
+def test_critical_balance_refuses_interactive_requests_only():
+    budget = make_budget()
+
+    # Act
+    budget.reconcile(2)
+
+    # Assert
+    assert budget.level == CRITICAL
+    with pytest.raises(BudgetExceededError):
+        budget.check("user_clips", INTERACTIVE)
+    budget.check("user_clips", BACKGROUND)
+    budget.check("balance", INTERACTIVE)
+
+
+def test_critical_balance_stops_background_refreshes(tmp_path):
+    budget = make_budget()
+    cache = InstagramCache(FileCache(str(tmp_path)), ttl={"user_clips": 0}, stale_ttl={"user_clips": 60})
+    budget.attach(cache)
+    cache.set("user_clips", "alice", ["old"])
+    loads = []
+
+    # Act
+    budget.reconcile(2)
+    entry = cache.get_or_load("user_clips", "alice", lambda: loads.append(1) or ["new"])
+    cache._executor.shutdown(wait=True)
+
+    # Assert
+    assert entry.value == ["old"]
+    assert loads == []
+    assert cache.background_refresh is False
+
+
+def test_attached_caches_are_not_kept_alive_or_duplicated():
+    budget = make_budget()
+    kept = FakeCache()
+
+    # Act
+    budget.attach(kept)
+    budget.attach(kept)
+    budget.attach(FakeCache())
+    gc.collect()
+
+    # Assert
+    assert list(budget._caches) == [kept]
@@ -0,0 +1,230 @@
+import json
+import time
+
+from telegram_bot.instagram import codec
+from telegram_bot.instagram.cache import (
+    CacheEntry,
+    FileCache,
+    InstagramCache,
+    MemoryCache,
+    RawArchive,
+    SQLiteCache,
+)
+
+
+def make_cache(tmp_path, ttl=60, stale_ttl=60):
+    return InstagramCache(
+        FileCache(str(tmp_path)),
+        ttl={"user_clips": ttl},
+        stale_ttl={"user_clips": stale_ttl},
+    )
+
+
+def test_fresh_entry_is_served_without_loading(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("user_clips", "alice", [{"pk": 1}])
+
+    # Act
+    entry = cache.get_or_load("user_clips", "alice", lambda: [{"pk": 2}])
+
+    # Assert
+    assert entry.value == [{"pk": 1}]
+
+
+def test_stale_entry_is_served_and_refreshed(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.backend.set("user_clips", "alice", CacheEntry([{"pk": 1}], time.time() - 90))
+
+    # Act
+    entry = cache.get_or_load("user_clips", "alice", lambda: [{"pk": 2}])
+    cache._executor.shutdown(wait=True)
+
+    # Assert
+    assert entry.value == [{"pk": 1}]
+    assert cache.get("user_clips", "alice").value == [{"pk": 2}]
+
+
+def test_expired_entry_is_reloaded(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.backend.set("user_clips", "alice", CacheEntry([{"pk": 1}], time.time() - 500))
+
+    # Act
+    entry = cache.get_or_load("user_clips", "alice", lambda: [{"pk": 2}])
+
+    # Assert
+    assert entry.value == [{"pk": 2}]
+
+
+def test_legacy_file_uses_mtime(tmp_path):
+    (tmp_path / "user" / "alice").mkdir(parents=True)
+    (tmp_path / "user" / "alice" / "reels.json").write_text(json.dumps([{"pk": 1}]))
+
+    # Act
+    entry = FileCache(str(tmp_path)).get("user_clips", "alice")
+
+    # Assert
+    assert entry.value == [{"pk": 1}]
+    assert entry.age() < 5
+
+
+def test_memory_cache_evicts_least_recently_used():
+    memory = MemoryCache(max_entries=2)
+    memory.set("user_clips", "alice", CacheEntry([1], 0))
+    memory.set("user_clips", "bob", CacheEntry([2], 0))
+    memory.get("user_clips", "alice")
+
+    # Act
+    memory.set("user_clips", "carol", CacheEntry([3], 0))
+
+    # Assert
+    assert memory.get("user_clips", "bob") is None
+    assert memory.get("user_clips", "alice").value == [1]
+
+
+def test_memory_cache_respects_byte_budget():
+    memory = MemoryCache(max_entries=100, max_bytes=2000)
+
+    # Act
+    for i in range(20):
+        memory.set("user_clips", str(i), CacheEntry(["x" * 100], 0))
+
+    # Assert
+    assert memory.total_bytes <= 2000
+    assert memory.get("user_clips", "19") is not None
+    assert memory.get("user_clips", "0") is None
+
+
+def test_negative_entry_expires_with_its_reason_ttl(tmp_path):
+    cache = InstagramCache(
+        FileCache(str(tmp_path)),
+        ttl={},
+        stale_ttl={},
+        negative_ttl={"not_found": 60, "private": 600},
+    )
+    cache.set_negative("user_negative", "alice", "private")
+    cache.backend.set("user_negative", "bob", CacheEntry({"reason": "not_found"}, time.time() - 120))
+
+    # Act / Assert
+    assert cache.get_negative("user_negative", "alice") == "private"
+    assert cache.get_negative("user_negative", "bob") is None
+    assert cache.get_negative("user_negative", "carol") is None
+
+
+def test_projected_kinds_are_stored_projected_and_archived(tmp_path):
+    archive = RawArchive(str(tmp_path / "archive"))
+    cache = InstagramCache(
+        FileCache(str(tmp_path)),
+        ttl={"user_clips": 60},
+        stale_ttl={"user_clips": 60},
+        projections={"user_clips": (1, lambda medias: [{"pk": media["pk"]} for media in medias])},
+        archive=archive,
+    )
+    (tmp_path / "user" / "bob").mkdir(parents=True)
+    (tmp_path / "user" / "bob" / "reels.json").write_text(json.dumps([{"pk": 2, "music": {}}]))
+
+    # Act
+    cache.set("user_clips", "alice", [{"pk": 1, "image_versions": []}])
+
+    # Assert
+    stored = codec.decode((tmp_path / "user" / "alice" / "reels.json").read_bytes())
+    assert stored["schema"] == 1
+    assert stored["value"] == [{"pk": 1}]
+    assert cache.get("user_clips", "bob").value == [{"pk": 2}]
+    assert len(list((tmp_path / "archive" / "user_clips").iterdir())) == 1
+
+
+def test_sqlite_backend_round_trips_and_bulk_reads(tmp_path):
+    cache = InstagramCache(
+        SQLiteCache(str(tmp_path / "cache.sqlite3")),
+        ttl={"user_clips": 60},
+        stale_ttl={"user_clips": 60},
+    )
+    cache.set("user_clips", "alice", [{"pk": 1}])
+    cache.set("user_clips", "bob", [{"pk": 2}])
+
+    # Act
+    entries = cache.get_many("user_clips", ["alice", "bob", "carol"])
+    deleted = cache.backend.delete_expired(now=time.time() + 121)
+
+    # Assert
+    assert {key: entry.value for key, entry in entries.items()} == {"alice": [{"pk": 1}], "bob": [{"pk": 2}]}
+    assert deleted == 2
+    assert cache.get("user_clips", "alice") is None
+
+
+def test_file_backend_keeps_keys_inside_cache_dir(tmp_path):
+    backend = FileCache(str(tmp_path / "cache"))
+
+    # Act
+    backend.set("user_clips", "..", CacheEntry([{"pk": 1}], time.time()))
+    backend.set("user_clips", "a/b", CacheEntry([{"pk": 2}], time.time()))
+
+    # Assert
+    assert not (tmp_path / "reels.json").exists()
+    assert backend.get("user_clips", "..").value == [{"pk": 1}]
+    assert backend.get("user_clips", "a/b").value == [{"pk": 2}]
+
+
+def test_migration_compresses_legacy_files_in_place(tmp_path):
+    (tmp_path / "user" / "alice").mkdir(parents=True)
+    (tmp_path / "user" / "alice" / "reels.json").write_text(json.dumps([{"pk": 1, "title": "тест"}]))
+    cache = make_cache(tmp_path)
+
+    # Act
+    migrated = cache.migrate_from(cache.backend)
+
+    # Assert
+    assert migrated == 1
+    assert (tmp_path / "user" / "alice" / "reels.json").read_bytes()[:1] == codec.ZLIB_HEADER
+    assert cache.get("user_clips", "alice").value == [{"pk": 1, "title": "тест"}]
+
+
+def test_migration_projects_entries_of_projected_kinds(tmp_path):
+    source = FileCache(str(tmp_path / "files"))
+    source.set("user_clips", "alice", CacheEntry([{"pk": 1, "image_versions": []}], 1000.0))
+    cache = InstagramCache(
+        SQLiteCache(str(tmp_path / "cache.sqlite3")),
+        ttl={"user_clips": 60},
+        stale_ttl={"user_clips": 60},
+        projections={"user_clips": (1, lambda medias: [{"pk": media["pk"]} for media in medias])},
+    )
+
+    # Act
+    migrated = cache.migrate_from(source)
+
+    # Assert
+    assert migrated == 1
+    stored = cache.backend.get("user_clips", "alice")
+    assert stored.schema == 1
+    assert stored.value == [{"pk": 1}]
+    assert stored.fetched_at == 1000.0
+
+
+def test_sqlite_eviction_drops_least_recently_used_entries(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    for key in ("alice", "bob", "carol"):
+        backend.set("user_clips", key, CacheEntry([{"pk": key}], time.time()))
+    backend.get("user_clips", "alice")
+
+    # Act
+    evicted = backend.evict(max_bytes=10**6, max_entries=2)
+
+    # Assert
+    assert evicted == 1
+    assert backend.get("user_clips", "bob") is None
+    assert backend.get("user_clips", "alice") is not None
+
+
+def test_file_eviction_drops_least_frequently_used_files(tmp_path):
+    backend = FileCache(str(tmp_path))
+    for key in ("alice", "bob"):
+        backend.set("user_clips", key, CacheEntry([{"pk": key}], time.time()))
+    backend.get("user_clips", "alice")
+
+    # Act
+    evicted = backend.evict(max_bytes=10**6, max_entries=1, policy="lfu")
+
+    # Assert
+    assert evicted == 1
+    assert not (tmp_path / "user" / "bob").exists()
+    assert backend.get("user_clips", "alice") is not None
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+from telegram_bot.instagram.concurrency import BACKGROUND, INTERACTIVE, AsyncSingleFlight, RateLimiter, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "reels"
+
+    # Act
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do(("user_clips", "alice", 10), fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert len(calls) == 1
+    assert results == ["reels"] * 5
+
+
+def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+
+    # Act
+    first = single_flight.do(("user_clips", "alice", 10), lambda: 1)
+    second = single_flight.do(("user_clips", "alice", 30), lambda: 2)
+
+    # Assert
+    assert (first, second) == (1, 2)
+
+
+def test_rate_limiter_paces_requests():
+    limiter = RateLimiter(rate=20, burst=1, max_in_flight=10)
+
+    # Act
+    start = time.monotonic()
+    for _ in range(5):
+        with limiter.limit():
+            pass
+    elapsed = time.monotonic() - start
+
+    # Assert
+    assert elapsed >= 0.15
+    assert limiter.stats()["interactive"].acquired == 5
+
+
+def test_interactive_lane_overtakes_background():
+    limiter = RateLimiter(rate=1000, burst=10, max_in_flight=1)
+    order = []
+    limiter.acquire(INTERACTIVE)
+
+    def worker(priority, name):
+        limiter.acquire(priority)
+        order.append(name)
+        limiter.release()
+
+    background = threading.Thread(target=worker, args=(BACKGROUND, "background"))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=worker, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    time.sleep(0.05)
+
+    # Act
+    limiter.release()
+    background.join()
+    interactive.join()
+
+    # Assert
+    assert order == ["interactive", "background"]
+
+
+def test_cancelled_async_waiter_takes_no_slot():
+    limiter = RateLimiter(rate=1000, burst=10, max_in_flight=1)
+    limiter.acquire(INTERACTIVE)
+
+    async def run():
+        waiter = asyncio.create_task(limiter.acquire_async(INTERACTIVE))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        # The slot is free again for the next caller
+        await asyncio.wait_for(limiter.acquire_async(BACKGROUND), timeout=1)
+
+    # Act
+    asyncio.run(run())
+
+    # Assert
+    assert limiter.in_flight == 1
+    assert limiter.stats()["interactive"].acquired == 1
+
+
+def test_cancelled_async_leader_does_not_cancel_followers():
+    single_flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "reels"
+
+    async def run():
+        leader = asyncio.create_task(single_flight.do("alice", fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(single_flight.do("alice", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    # Act
+    result, leader_cancelled = asyncio.run(run())
+
+    # Assert
+    assert (result, leader_cancelled) == ("reels", True)
+    assert calls == [1]
@@ -0,0 +1,81 @@
+import pytest
+from hikerapi import Client
+
+from telegram_bot.instagram.cache import FileCache, InstagramCache
+from telegram_bot.instagram.fake_hikerapi import FakeHikerAPI, FakeHikerAPIServer, create_fake_wrapper
+from telegram_bot.instagram.resilience import CircuitBreaker, RetryPolicy
+from telegram_bot.instagram.service import InstagramWrapper
+
+
+@pytest.fixture
+def api():
+    return FakeHikerAPI.synthetic(n_users=3, n_clips=5, private=1, latency={"distribution": "fixed", "seconds": 0})
+
+
+@pytest.fixture
+def wrapper_for(tmp_path):
+    def make(server, client=None):
+        if client is None:
+            wrapper = create_fake_wrapper(server.url)
+        else:
+            wrapper = InstagramWrapper("fake", client=client, base_url=server.url)
+        wrapper.cache = InstagramCache(
+            FileCache(str(tmp_path)),
+            ttl={"user_info": 60, "user_clips": 60},
+            stale_ttl={"user_info": 0, "user_clips": 0},
+            negative_ttl={"not_found": 60, "private": 60, "no_reels": 60},
+        )
+        wrapper.retry_policy = RetryPolicy(max_attempts=2, base_delay=0)
+        wrapper.breaker = CircuitBreaker(min_calls=100)
+        return wrapper
+
+    return make
+
+
+def test_wrapper_reads_reels_and_balance_from_fake_server(api, wrapper_for):
+    with FakeHikerAPIServer(api) as server:
+        wrapper = wrapper_for(server)
+
+        # Act
+        user = wrapper.get_user_info("user1")
+        reels = wrapper.fetch_user_reels(user["data"], n_media_items=3)
+        private = wrapper.fetch_user_reels(wrapper.get_user_info("user0")["data"])
+        missing = wrapper.get_user_info("nobody")
+        balance = wrapper.get_balance()
+
+    # Assert
+    assert [reel.owner for reel in reels["data"]] == ["user1"] * 3
+    assert private["status"] == 403
+    assert missing["status"] == 404
+    assert balance["data"]["amount"] == 100.0
+
+
+def test_rate_limited_requests_are_retried_then_fail(api, wrapper_for):
+    api.rate_limit_rate = 1.0
+    with FakeHikerAPIServer(api) as server:
+        wrapper = wrapper_for(server)
+
+        # Act
+        response = wrapper.get_user_info("user1")
+
+    # Assert
+    assert response["status"] == 500
+    assert api.requests["/v1/user/by/username"] == 2
+
+
+def test_error_bodies_of_the_real_client_are_retried_and_open_the_breaker(api, wrapper_for):
+    api.error_rate = 1.0
+    with FakeHikerAPIServer(api) as server:
+        client = Client(token="fake")
+        client._client.base_url = server.url
+        wrapper = wrapper_for(server, client)
+        wrapper.breaker = CircuitBreaker(min_calls=4, reset_timeout=60)
+
+        # Act
+        responses = [wrapper.get_user_info(f"user{index}", stale_ok=False) for index in range(3)]
+
+    # Assert
+    assert [response["status"] for response in responses] == [500, 500, 500]
+    # Two attempts each until the breaker opened after the fourth failure
+    assert api.requests["/v1/user/by/username"] == 4
+    assert wrapper.breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,101 @@
+import httpx
+import pytest
+
+from telegram_bot.instagram.cache import CacheEntry, FileCache, InstagramCache
+from telegram_bot.instagram.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def http_error(status):
+    request = httpx.Request("GET", "https://api.test")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def test_retry_policy_retries_transient_errors():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+    attempts = []
+
+    def fetch():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise http_error(503)
+        return "ok"
+
+    # Act
+    result = policy.call(fetch)
+
+    # Assert
+    assert result == "ok"
+    assert len(attempts) == 3
+
+
+def test_retry_policy_does_not_retry_fatal_errors():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+    attempts = []
+
+    def fetch():
+        attempts.append(1)
+        raise http_error(404)
+
+    # Act / Assert
+    with pytest.raises(httpx.HTTPStatusError):
+        policy.call(fetch)
+    assert len(attempts) == 1
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=2, reset_timeout=60)
+    now = [0.0]
+    monkeypatch.setattr("telegram_bot.instagram.resilience.time.monotonic", lambda: now[0])
+
+    def failing():
+        raise httpx.ConnectError("down")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            breaker.call(failing)
+
+    # Act / Assert
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "ok")
+    now[0] = 61
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cache_serves_expired_entry_while_circuit_is_open(tmp_path):
+    cache = InstagramCache(FileCache(str(tmp_path)), ttl={"user_clips": 1}, stale_ttl={"user_clips": 1})
+    cache.backend.set("user_clips", "alice", CacheEntry([{"pk": 1}], 0))
+
+    def loader():
+        raise CircuitOpenError()
+
+    # Act
+    entry = cache.get_or_load("user_clips", "alice", loader)
+
+    # Assert
+    assert entry.value == [{"pk": 1}]
+
+
+def test_fatal_error_does_not_close_a_half_open_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=1, reset_timeout=60)
+    now = [0.0]
+    monkeypatch.setattr("telegram_bot.instagram.resilience.time.monotonic", lambda: now[0])
+
+    def failing():
+        raise httpx.ConnectError("down")
+
+    def not_found():
+        raise http_error(404)
+
+    with pytest.raises(httpx.ConnectError):
+        breaker.call(failing)
+    now[0] = 61
+
+    # Act
+    with pytest.raises(httpx.HTTPStatusError):
+        breaker.call(not_found)
+
+    # Assert
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
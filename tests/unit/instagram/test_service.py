@@ -0,0 +1,230 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from telegram_bot.instagram.cache import FileCache, InstagramCache
+from telegram_bot.instagram.reels import normalize_media, parse_taken_at
+from telegram_bot.instagram.service import InstagramWrapper, merge_media
+
+USER = {"username": "alice", "pk": "1", "is_private": False, "follower_count": 100}
+
+
+def make_media(pk, days_ago, play_count=100):
+    taken_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return {
+        "pk": pk,
+        "id": f"{pk}_1",
+        "media_type": 2,
+        "play_count": play_count,
+        "like_count": 10,
+        "comment_count": 1,
+        "title": "",
+        "caption_text": "caption",
+        "taken_at": taken_at.isoformat().replace("+00:00", "Z"),
+        "code": f"code{pk}",
+        "video_url": f"https://example.com/{pk}.mp4",
+    }
+
+
+class FakeClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.chunk_calls = 0
+        self.full_calls = 0
+
+    def user_clips_v1(self, user_id, amount):
+        self.full_calls += 1
+        return [media for page in self.pages for media in page][:amount]
+
+    def user_clips_chunk_v1(self, user_id, end_cursor=None):
+        index = int(end_cursor or 0)
+        self.chunk_calls += 1
+        next_cursor = str(index + 1) if index + 1 < len(self.pages) else None
+        return [self.pages[index], next_cursor]
+
+
+@pytest.fixture
+def wrapper(tmp_path):
+    wrapper = InstagramWrapper("token")
+    wrapper.cache = InstagramCache(
+        FileCache(str(tmp_path)),
+        ttl={"user_clips": 0, "user_negative": 0},
+        stale_ttl={"user_clips": 0},
+    )
+    return wrapper
+
+
+def test_merge_media_prefers_fetched_metrics():
+    cached = [make_media("2", 2, play_count=10), make_media("1", 20)]
+    fetched = [make_media("3", 1), make_media("2", 2, play_count=50)]
+
+    # Act
+    merged = merge_media(cached, fetched, limit=10)
+
+    # Assert
+    assert [media["pk"] for media in merged] == ["3", "2", "1"]
+    assert merged[1]["play_count"] == 50
+
+
+def test_incremental_fetch_stops_at_known_reels_outside_window(wrapper):
+    old_pages = [[make_media("2", 3), make_media("1", 20)]]
+    wrapper.client = FakeClient(old_pages)
+    wrapper.fetch_user_reels(USER, n_media_items=2, stale_ok=False)
+
+    wrapper.client = FakeClient([
+        [make_media("3", 1)],
+        [make_media("2", 3, play_count=500), make_media("1", 20)],
+        [make_media("0", 30)],
+    ])
+
+    # Act
+    response = wrapper.fetch_user_reels(USER, n_media_items=3, stale_ok=False)
+
+    # Assert
+    assert wrapper.client.full_calls == 0
+    assert wrapper.client.chunk_calls == 2
+    assert [reel.pk for reel in response["data"]] == ["3", "2", "1"]
+    assert response["data"][1].play_count == 500
+
+
+def test_incremental_fetch_keeps_the_fetch_time_of_medias_not_paged_again(wrapper):
+    wrapper.cache.set("user_clips", "alice", [make_media("2", 20), make_media("1", 30)], fetched_at=1000.0)
+    wrapper.client = FakeClient([[make_media("3", 1), make_media("2", 20, play_count=500)], [make_media("1", 30)]])
+
+    # Act
+    response = wrapper.fetch_user_reels(USER, n_media_items=3, stale_ok=False)
+    refetched = wrapper.fetch_user_reels(USER, n_media_items=3, stale_ok=False)
+
+    # Assert
+    assert wrapper.client.chunk_calls == 2
+    fetched_at = {reel.pk: reel.fetched_at for reel in response["data"]}
+    assert fetched_at["1"] == 1000.0
+    assert fetched_at["3"] > 1000.0 and fetched_at["2"] > 1000.0
+    assert {reel.pk: reel.fetched_at for reel in refetched["data"]}["1"] == 1000.0
+
+
+def test_normalize_media_skips_unviewed_and_non_video_medias():
+    medias = [make_media("1", 1), make_media("2", 1, play_count=0), {**make_media("3", 1), "media_type": 1}]
+    medias[0]["user"] = {"username": "bob"}
+
+    # Act
+    reels = normalize_media(medias)
+
+    # Assert
+    assert [reel.pk for reel in reels] == ["1"]
+    assert reels[0].owner == "bob"
+    assert reels[0].link == "https://www.instagram.com/reel/code1/"
+    assert reels[0].er == 0.11
+    assert reels[0].post_date.tzinfo == timezone.utc
+    assert abs(reels[0].posted_at - (datetime.now(timezone.utc) - timedelta(days=1)).timestamp()) < 60
+
+
+def test_larger_cached_set_serves_smaller_requests_and_tail_is_paged(wrapper):
+    wrapper.cache.ttl["user_clips"] = 60
+    pages = [[make_media(str(9 - index * 3 - offset), (index * 3 + offset) * 10) for offset in range(3)]
+             for index in range(3)]
+    wrapper.client = FakeClient(pages)
+    wrapper.fetch_user_reels(USER, n_media_items=4, stale_ok=False)
+
+    # Act
+    smaller = wrapper.fetch_user_reels(USER, n_media_items=2, stale_ok=False)
+    calls_after_smaller = (wrapper.client.full_calls, wrapper.client.chunk_calls)
+    larger = wrapper.fetch_user_reels(USER, n_media_items=6, stale_ok=False)
+
+    # Assert
+    assert [reel.pk for reel in smaller["data"]] == ["9", "8"]
+    assert calls_after_smaller == (1, 0)
+    assert wrapper.client.chunk_calls == 2
+    assert [reel.pk for reel in larger["data"]] == ["9", "8", "7", "6", "5", "4"]
+    assert wrapper.cache.get("user_clips", "alice").amount == 6
+
+
+def test_reel_stream_fetches_pages_only_as_consumed(wrapper):
+    wrapper.client = FakeClient([[make_media("3", 1)], [make_media("2", 20)], [make_media("1", 30)]])
+    window_start = (datetime.now(timezone.utc) - timedelta(days=14)).timestamp()
+    recent = []
+
+    # Act
+    for page in wrapper.iter_user_reels(USER):
+        page_recent = [reel for reel in page if reel.posted_at > window_start]
+        recent.extend(page_recent)
+        if len(page_recent) < len(page):
+            break
+
+    # Assert
+    assert [reel.pk for reel in recent] == ["3"]
+    assert wrapper.client.chunk_calls == 2
+    assert [media["pk"] for media in wrapper.cache.get("user_clips", "alice").value] == ["3", "2"]
+
+
+def test_only_explicit_not_found_answers_are_remembered(wrapper):
+    answers = [{"detail": "Not enough balance"}, {"detail": "Target user not found", "exc_type": "UserNotFound"}]
+
+    class UserClient:
+        def user_by_username_v1(self, username):
+            return answers.pop(0)
+
+    wrapper.client = UserClient()
+    wrapper.cache.ttl["user_info"] = 60
+    wrapper.cache.stale_ttl["user_info"] = 0
+    wrapper.cache.negative_ttl["not_found"] = 60
+
+    # Act
+    failed = wrapper.get_user_info("alice")
+    reason_after_failure = wrapper.get_negative_reason("alice")
+    missing = wrapper.get_user_info("alice")
+
+    # Assert
+    assert failed["status"] == 500
+    assert reason_after_failure is None
+    assert missing["status"] == 404
+    assert wrapper.get_negative_reason("alice") == "not_found"
+
+
+def test_partial_reel_stream_keeps_the_cached_entry_age(wrapper):
+    wrapper.cache.set("user_clips", "alice", [make_media("2", 20), make_media("1", 30)], fetched_at=1000.0)
+    wrapper.client = FakeClient([[make_media("3", 1)], [make_media("2", 20), make_media("1", 30)]])
+
+    # Act
+    stream = wrapper.iter_user_reels(USER)
+    next(stream)
+    stream.close()
+    partial = wrapper.cache.get("user_clips", "alice")
+    list(wrapper.iter_user_reels(USER))
+    complete = wrapper.cache.get("user_clips", "alice")
+
+    # Assert
+    assert [media["pk"] for media in partial.value] == ["3", "2", "1"]
+    assert partial.fetched_at == 1000.0
+    assert complete.fetched_at > 1000.0
+
+
+def test_invalid_post_time_is_kept_apart_from_a_missing_one():
+    medias = [make_media("1", 1), make_media("2", 1), make_media("3", 1)]
+    medias[1]["taken_at"] = "yesterday"
+    medias[2]["taken_at"] = None
+
+    # Act
+    reels = normalize_media(medias, owner="alice")
+
+    # Assert
+    assert reels[0].post_date is not None
+    assert math.isnan(reels[1].posted_at) and reels[1].post_date is None
+    assert reels[2].posted_at is None and reels[2].post_date is None
+
+
+def test_post_time_without_offset_is_read_as_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+
+    # Act
+    try:
+        naive = parse_taken_at("2024-05-01T12:00:00")
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    # Assert
+    assert naive == parse_taken_at("2024-05-01T12:00:00Z") == datetime(2024, 5, 1, 12, tzinfo=timezone.utc).timestamp()
@@ -0,0 +1,27 @@
+from telegram_bot.instagram.fake_hikerapi import FakeHikerAPI, FakeHikerAPIServer, create_fake_wrapper
+
+
+def test_recorded_traffic_is_replayed_without_the_server(tmp_path):
+    archive = str(tmp_path / "traffic.jsonl.gz")
+    api = FakeHikerAPI.synthetic(n_users=2, n_clips=4)
+    with FakeHikerAPIServer(api) as server:
+        recording = create_fake_wrapper(server.url)
+        recording.use_cache = False
+        recording.record_traffic(archive)
+        user = recording.get_user_info("user1")["data"]
+        recorded = recording.fetch_user_reels(user, n_media_items=4)["data"]
+        recording.get_balance()
+    requests_made = sum(api.requests.values())
+
+    replaying = create_fake_wrapper(server.url)
+    replaying.use_cache = False
+    replaying.replay_traffic(archive)
+
+    # Act
+    replayed = replaying.fetch_user_reels(replaying.get_user_info("user1")["data"], n_media_items=4)["data"]
+    balance = replaying.get_balance()
+
+    # Assert
+    assert [reel.pk for reel in replayed] == [reel.pk for reel in recorded]
+    assert balance["data"]["amount"] == api.balance
+    assert sum(api.requests.values()) == requests_made
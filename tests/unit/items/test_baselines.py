@@ -0,0 +1,28 @@
+import random
+
+import numpy as np
+import pytest
+
+from telegram_bot.items.baselines import P2Quantile, ema
+
+
+@pytest.mark.parametrize("p", [0.5, 0.9])
+def test_p2_quantile_tracks_stream_quantile(p):
+    rng = random.Random(3)
+    values = [rng.lognormvariate(8, 1) for _ in range(5000)]
+    sketch = P2Quantile(p)
+
+    # Act, restoring the sketch from its stored state along the way
+    for index, value in enumerate(values):
+        sketch.add(value)
+        if index % 1000 == 0:
+            sketch = P2Quantile(p, sketch.to_dict())
+
+    # Assert
+    assert sketch.count == len(values)
+    assert sketch.value == pytest.approx(np.quantile(values, p), rel=0.05)
+
+
+def test_ema_starts_with_first_value():
+    assert ema(None, 10.0, 0.2) == 10.0
+    assert ema(10.0, 20.0, 0.2) == pytest.approx(12.0)
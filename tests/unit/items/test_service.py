@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from telegram_bot.auth.models import User  # noqa: F401 - registers the users table
+from telegram_bot.items.models import InstagramAccount
+from telegram_bot.items.service import profile_needs_refresh, update_instagram_account_profile, utc_now
+from telegram_bot.models import Base
+
+MAX_AGE = timedelta(hours=72)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_stored_profile_is_refreshed_by_age(db_session):
+    account = InstagramAccount(username="alice")
+    db_session.add(account)
+    db_session.commit()
+
+    # Act
+    missing = profile_needs_refresh(account, MAX_AGE)
+    update_instagram_account_profile(
+        db_session, account, {"username": "alice", "pk": 42, "is_private": False, "follower_count": 1000}
+    )
+    stored = profile_needs_refresh(account, MAX_AGE)
+    account.profile_refreshed_at = utc_now() - MAX_AGE - timedelta(minutes=1)
+    expired = profile_needs_refresh(account, MAX_AGE)
+
+    # Assert
+    assert (missing, stored, expired) == (True, False, True)
+    db_session.expire_all()
+    assert account.user_info() == {"username": "alice", "pk": "42", "is_private": False, "follower_count": 1000}
@@ -0,0 +1,94 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from telegram_bot.auth.models import User  # noqa: F401 - registers the users table
+from telegram_bot.instagram.reels import Reel
+from telegram_bot.items.models import InstagramAccount, InstagramReels
+from telegram_bot.items.service import (
+    compact_reel_snapshots,
+    get_view_velocities,
+    read_account_baselines,
+    record_reel_snapshots,
+)
+from telegram_bot.models import Base
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def make_reel(play_count: int, fetched_at: float) -> Reel:
+    return Reel("1", "1_0", "C1", "", "", 10, 1, play_count, None, "", "user0", fetched_at=fetched_at)
+
+
+def test_snapshots_give_view_velocity(db_session):
+    account = InstagramAccount(username="user0")
+    db_session.add(account)
+    db_session.commit()
+    now = time.time()
+
+    # Act
+    assert record_reel_snapshots(db_session, account, [make_reel(1000, now - 2 * 3600)]) == 1
+    assert record_reel_snapshots(db_session, account, [make_reel(1000, now - 2 * 3600)]) == 0
+    assert record_reel_snapshots(db_session, account, [make_reel(5000, now)]) == 1
+    velocities = get_view_velocities(db_session, ["1"], timedelta(hours=24))
+
+    # Assert
+    assert db_session.query(InstagramReels).count() == 2
+    assert velocities["1"] == pytest.approx(2000, rel=1e-3)
+    assert get_view_velocities(db_session, ["1"], timedelta(hours=1)) == {}
+
+
+def test_snapshots_update_account_baseline(db_session):
+    account = InstagramAccount(username="user0")
+    db_session.add(account)
+    db_session.commit()
+    now = time.time()
+
+    # Act
+    record_reel_snapshots(db_session, account, [make_reel(1000, now - 2 * 3600)])
+    record_reel_snapshots(db_session, account, [make_reel(5000, now)])
+    baseline = read_account_baselines(db_session, ["user0"])["user0"]
+
+    # Assert
+    assert baseline.snapshots == 2
+    assert baseline.views_per_hour == pytest.approx(2000, rel=1e-3)
+    assert baseline.views_median == 1000
+    assert len(baseline.sketches["views_median"]["heights"]) == 1
+    assert baseline.engagement_p90 >= baseline.engagement_median > 0
+
+
+def test_compaction_rolls_up_old_snapshots(db_session):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    posted_at = now - timedelta(days=10)
+    # Every 20 minutes over the last 9 days of a reel, and a snapshot of a reel past the window
+    captures = [now - timedelta(minutes=10 + 20 * step) for step in range(9 * 24 * 3)]
+    db_session.add_all(
+        InstagramReels(reel_id="1", url="", views=step, captured_at=captured_at, posted_at=posted_at)
+        for step, captured_at in enumerate(captures)
+    )
+    db_session.add(InstagramReels(reel_id="2", url="", captured_at=now, posted_at=now - timedelta(days=20)))
+    db_session.commit()
+
+    # Act
+    result = compact_reel_snapshots(db_session, full_resolution_days=3, hourly_days=7)
+
+    # Assert
+    remaining = [row.captured_at for row in db_session.query(InstagramReels).order_by(InstagramReels.captured_at)]
+    assert result["dropped"] == 1
+    assert result["rolled_up"] == len(captures) - len(remaining)
+    full_resolution = [at for at in remaining if at >= now - timedelta(days=3)]
+    hourly = [at for at in remaining if now - timedelta(days=7) <= at < now - timedelta(days=3)]
+    daily = [at for at in remaining if at < now - timedelta(days=7)]
+    assert len(full_resolution) == 3 * 24 * 3
+    assert len(hourly) == len({at.replace(minute=0, second=0, microsecond=0) for at in hourly}) <= 4 * 24 + 1
+    assert len(daily) == len({at.date() for at in daily}) <= 3
@@ -0,0 +1,54 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from telegram_bot.items.service import calculate_trend_category
+from telegram_bot.items.trends import TREND_CATEGORIES, score_reels
+
+
+def reference_scores(views, likes, comments, followers, post_date, now):
+    """Per-reel rules of analyze_account_trends and calculate_trend_category before vectorization"""
+    engagement_rate = (likes + comments) / views if views > 0 else 0
+    trending = views > 0 and (engagement_rate > 0.05 or views > followers)
+    if isinstance(post_date, str):
+        # Reels whose post date does not parse were skipped
+        trending = False
+        post_date = None
+    if post_date and (now - post_date).days > 14:
+        trending = False
+    category = calculate_trend_category(views, likes, comments, followers, 0, post_date)
+    return engagement_rate, trending, category
+
+
+def test_vectorized_scores_match_scalar_rules():
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    rows = []
+    for _ in range(2000):
+        views = rng.choice([0, rng.randint(1, 100), rng.randint(1, 10**7)])
+        followers = rng.choice([0, rng.randint(1, 10**6)])
+        # Keep ages off the 24 hour and 15 day boundaries, the reference reads the clock itself
+        hours = rng.choice([rng.uniform(0, 23), rng.uniform(25, 359), rng.uniform(361, 1000)])
+        post_date = rng.choice([None, "invalid"]) if rng.random() < 0.1 else now - timedelta(hours=hours)
+        likes = rng.randint(0, max(views, 1) // 4)
+        comments = rng.randint(0, max(views, 1) // 50)
+        rows.append((views, likes, comments, followers, post_date))
+
+    # Act
+    scores = score_reels(
+        views=np.array([row[0] for row in rows]),
+        likes=np.array([row[1] for row in rows]),
+        comments=np.array([row[2] for row in rows]),
+        followers=np.array([row[3] for row in rows]),
+        posted_at=np.array([row[4].timestamp() if isinstance(row[4], datetime) else np.nan for row in rows]),
+        invalid_posted_at=np.array([row[4] == "invalid" for row in rows]),
+        now=now.timestamp(),
+    )
+
+    # Assert
+    for index, row in enumerate(rows):
+        engagement_rate, trending, category = reference_scores(*row, now)
+        assert scores["engagement"][index] == engagement_rate
+        assert bool(scores["trending"][index]) == trending
+        assert TREND_CATEGORIES[scores["category"][index]] == category
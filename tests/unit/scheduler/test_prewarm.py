@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from telegram_bot.items.models import InstagramAccount
+from telegram_bot.scheduler import service, tasks
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeWrapper:
+    def __init__(self, clock, negative):
+        self.clock = clock
+        self.negative = negative
+        self.fetched = []
+
+    def get_negative_reason(self, username):
+        return "private" if username in self.negative else None
+
+    def fetch_user_reels(self, user_info, n_media_items, stale_ok):
+        self.fetched.append((user_info["username"], self.clock.now))
+        return {"status": 200, "data": []}
+
+
+def make_account(username):
+    return InstagramAccount(username=username, pk="1", follower_count=10, profile_refreshed_at=datetime.now())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tasks, "time", clock)
+    return clock
+
+
+def test_prewarm_spreads_accounts_over_the_window_and_skips_negative_ones(monkeypatch, clock):
+    usernames = ["alice", "bob", "carol", "dave"]
+    owner = SimpleNamespace(id=1)
+    wrapper = FakeWrapper(clock, negative={"carol"})
+    monkeypatch.setattr(tasks, "instagram_wrapper", wrapper)
+    monkeypatch.setattr(tasks, "get_db", lambda: iter([SimpleNamespace(close=lambda: None)]))
+    monkeypatch.setattr(
+        tasks, "get_tracked_accounts", lambda db_session: [(make_account(name), owner) for name in usernames]
+    )
+
+    # Act
+    tasks.prewarm_instagram_cache()
+
+    # Assert
+    interval = tasks.config.app.prewarm.window_minutes * 60 / len(usernames)
+    assert wrapper.fetched == [("alice", 0.0), ("bob", interval), ("dave", 3 * interval)]
+
+
+def test_first_prewarm_run_is_lead_minutes_before_the_trend_run(monkeypatch):
+    scheduler = BackgroundScheduler()
+    monkeypatch.setattr(service, "scheduler", scheduler)
+
+    # Act
+    service.init_scheduler()
+    try:
+        trend_run = scheduler.get_job("trend_notifications").next_run_time
+        prewarm_run = scheduler.get_job("instagram_cache_prewarm").next_run_time
+    finally:
+        scheduler.shutdown(wait=False)
+
+    # Assert
+    assert trend_run - prewarm_run == timedelta(minutes=tasks.config.app.prewarm.lead_minutes)
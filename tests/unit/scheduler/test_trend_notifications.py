@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+from telegram_bot.items.models import InstagramAccount
+from telegram_bot.items.service import utc_now
+from telegram_bot.scheduler import tasks
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+        self.closed = False
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_failure_for_one_user_does_not_skip_the_others(monkeypatch):
+    db_session = FakeSession()
+    owners = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+    wrapper = SimpleNamespace(warm_user_clips=lambda usernames: 0, get_negative_reason=lambda username: "private")
+    sent = []
+
+    def send_user_notifications(user, reels, db_session):
+        if user.id == 1:
+            raise RuntimeError("telegram is down")
+        sent.append(user.id)
+
+    monkeypatch.setattr(tasks, "instagram_wrapper", wrapper)
+    monkeypatch.setattr(tasks, "get_db", lambda: iter([db_session]))
+    monkeypatch.setattr(tasks, "cleanup_old_sent_reels", lambda db_session, days_old: None)
+    monkeypatch.setattr(
+        tasks, "get_tracked_accounts", lambda db_session: [(InstagramAccount(username="alice"), owner) for owner in owners]
+    )
+    monkeypatch.setattr(tasks, "get_view_velocities", lambda db_session, reel_ids, window: {})
+    monkeypatch.setattr(tasks, "read_account_baselines", lambda db_session, usernames: {})
+    monkeypatch.setattr(tasks, "filter_unsent_reels", lambda db_session, user_id, reels: reels)
+    monkeypatch.setattr(tasks, "send_user_notifications", send_user_notifications)
+
+    # Act
+    tasks._send_trend_notifications()
+
+    # Assert
+    assert sent == [2]
+    assert db_session.rollbacks == 1
+    assert db_session.closed
+
+
+def test_failed_snapshot_is_rolled_back_before_the_next_account(monkeypatch):
+    db_session = FakeSession()
+    owner = SimpleNamespace(id=1)
+    accounts = [
+        InstagramAccount(username=username, pk="1", is_private=False, follower_count=10, profile_refreshed_at=utc_now())
+        for username in ("alice", "bob")
+    ]
+    wrapper = SimpleNamespace(
+        warm_user_clips=lambda usernames: 0,
+        get_negative_reason=lambda username: None,
+        fetch_user_reels=lambda user_info, n_media_items, stale_ok: {"status": 200, "data": []},
+    )
+    recorded = []
+
+    def record_reel_snapshots(db_session, account, reels, velocity_alpha):
+        if account.username == "alice":
+            raise RuntimeError("database is locked")
+        recorded.append((account.username, db_session.rollbacks))
+
+    monkeypatch.setattr(tasks, "instagram_wrapper", wrapper)
+    monkeypatch.setattr(tasks, "get_db", lambda: iter([db_session]))
+    monkeypatch.setattr(tasks, "cleanup_old_sent_reels", lambda db_session, days_old: None)
+    monkeypatch.setattr(tasks, "get_tracked_accounts", lambda db_session: [(account, owner) for account in accounts])
+    monkeypatch.setattr(tasks, "record_reel_snapshots", record_reel_snapshots)
+    monkeypatch.setattr(tasks, "get_view_velocities", lambda db_session, reel_ids, window: {})
+    monkeypatch.setattr(tasks, "read_account_baselines", lambda db_session, usernames: {})
+    monkeypatch.setattr(tasks, "filter_unsent_reels", lambda db_session, user_id, reels: reels)
+    monkeypatch.setattr(tasks, "send_user_notifications", lambda user, reels, db_session: None)
+
+    # Act
+    tasks._send_trend_notifications()
+
+    # Assert
+    assert recorded == [("bob", 1)]